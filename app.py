@@ -1,42 +1,170 @@
 import streamlit as st
 from datetime import datetime, timedelta
-import pandas as pd
 import os
 import uuid
+import random
 
-from helper.gemini_helper import generate_email_with_gemini, generate_image_description_with_gemini
+from helper.gemini_helper import generate_image_description_with_gemini, IMAGE_DESCRIPTION_FALLBACK
 from helper.prompt_templates import EMAIL_PROMPT_TEMPLATES
-from helper.image_generator import generate_image
-from helper.mailjet_helper import send_test_email
-from helper.scheduler_helper import schedule_batch_emails, get_all_jobs, cancel_campaign
+from helper.generation_pipeline import generate_previews, generate_variant_previews, estimate_generation
+from helper.personalization import build_variant_prompts
+from helper.token_usage import get_campaign_usage
+from helper.send_planner import SendPlanner
+from helper.image_generator import pin_image
+from helper.mailjet_helper import send_test_email, send_bulk_emails
+from helper.contact_ingest import load_contacts
+from helper import metrics
+from helper.scheduler_helper import (
+    start_scheduler, schedule_batch_emails, seal_campaign, get_campaign_progress, cancel_campaign,
+    get_dead_letters, resend_dead_letters
+)
 
 st.set_page_config(page_title="AI Outreach Tool", page_icon="📧", layout="wide")
 st.title("📧 AI Outreach Automation Tool")
 
+# One scheduler per server process, started on the first page load instead of at import time
+@st.cache_resource
+def get_scheduler():
+    # Also exposes /metrics when METRICS_PORT is set
+    metrics.start_metrics_server()
+    return start_scheduler()
+
+get_scheduler()
+
+# Memoized on its inputs across reruns and sessions; each distinct topic/context/goal costs one Gemini call.
+# Errors raise instead of returning the fallback, and st.cache_data doesn't cache exceptions.
+@st.cache_data(show_spinner=False, ttl=3600)
+def cached_image_description(topic, context, goal):
+    return generate_image_description_with_gemini(topic=topic, context=context, goal=goal, raise_on_error=True)
+
+# Review pages show this many emails; on-demand generation also drafts a random sample this size up front
+REVIEW_PAGE_SIZE = int(os.getenv("REVIEW_PAGE_SIZE", "10"))
+REVIEW_SAMPLE_SIZE = int(os.getenv("REVIEW_SAMPLE_SIZE", "5"))
+ON_DEMAND_MODE = "Personalize with AI on demand (pages you review + a sample)"
+DASHBOARD_REFRESH_SECONDS = int(os.getenv("DASHBOARD_REFRESH_SECONDS", "10"))
+# The first emails of a generation run are streamed into the page as Gemini writes them
+STREAM_PREVIEW_COUNT = int(os.getenv("STREAM_PREVIEW_COUNT", "3"))
+
+def render_preview_stream(preview_stream, total):
+    """
+    Passes finished (idx, preview) pairs through while drawing a progress bar and a live list.
+    Partial previews (streamed emails) are rendered in place as their text arrives.
+    """
+    progress_bar = st.progress(0.0, text="Generating email previews...")
+    live_previews = st.container()
+    streaming = {}
+    completed = 0
+    for idx, preview in preview_stream:
+        if preview.get("partial"):
+            if idx not in streaming:
+                streaming[idx] = live_previews.empty()
+            streaming[idx].markdown(
+                f"✉️ **{preview['subject'] or '…'}** — {preview['recipient_name']}\n\n{preview['body']}"
+            )
+            continue
+        completed += 1
+        line = f"✉️ {preview['recipient_name']} <{preview['recipient_email']}> — {preview['subject']}"
+        if idx in streaming:
+            streaming[idx].write(line)
+        else:
+            live_previews.write(line)
+        progress_bar.progress(completed / total, text=f"Generated {completed}/{total} emails")
+        yield idx, preview
+
+def fill_previews(indices, show_progress=False, stream_first=0):
+    """
+    Generates the missing previews among indices (on-demand mode) from the form values captured when
+    "Generate & Preview" was clicked, so later edits to the form don't change half a campaign.
+    """
+    params = st.session_state.generation_params
+    missing = [idx for idx in indices if st.session_state.email_previews[idx] is None]
+    if not missing:
+        return
+
+    def build_prompt(entry):
+        return EMAIL_PROMPT_TEMPLATES[params["template_type"]].format(recipient_name=entry["Names"], **params["fields"])
+
+    targets = [params["targets"][idx] for idx in missing]
+    try:
+        preview_stream = generate_previews(
+            targets, build_prompt, params["image_description"], campaign_id=params["campaign_id"], stream_first=stream_first
+        )
+        if show_progress:
+            preview_stream = render_preview_stream(preview_stream, len(missing))
+        for position, preview in preview_stream:
+            # Without render_preview_stream the streamed text still arrives here; only finished previews count
+            if preview.get("partial"):
+                continue
+            if preview["img_path"] is None:
+                st.error("Failed to generate or download a fallback image. Please try again.")
+                st.stop()
+            st.session_state.email_previews[missing[position]] = preview
+    except (RuntimeError, ValueError) as e:
+        st.error(f"Email generation failed: {e}")
+        st.stop()
+
 # Initialize session state for email previews
 if 'email_previews' not in st.session_state:
     st.session_state.email_previews = []
 if 'generation_done' not in st.session_state:
     st.session_state.generation_done = False
+if 'sample_indices' not in st.session_state:
+    st.session_state.sample_indices = []
 
 # --- Campaign Dashboard ---
-st.sidebar.header("📊 Campaign Dashboard")
-jobs = get_all_jobs()
-if jobs:
-    for job_id, job in sorted(jobs.items()):
-        st.sidebar.write(f"🕓 {job['send_time'].strftime('%Y-%m-%d %H:%M')} | {job['status']} | {job['recipient']}")
-else:
-    st.sidebar.info("No campaigns scheduled yet.")
+# Refreshes on its own from the per-campaign counters; never walks individual jobs
+@st.fragment(run_every=DASHBOARD_REFRESH_SECONDS)
+def campaign_dashboard():
+    st.header("📊 Campaign Dashboard")
+    campaigns = get_campaign_progress()
+    if not campaigns:
+        st.info("No campaigns scheduled yet.")
+        return
+    usage = get_campaign_usage()
+    for cid, campaign in campaigns.items():
+        st.progress(campaign["progress"], text=f"Campaign {cid[:8]}: {campaign['done']}/{campaign['total']} done")
+        details = (
+            f"{campaign['scheduled']} scheduled | {campaign['sending']} sending | "
+            f"{campaign['sent']} sent | {campaign['failed']} failed"
+        )
+        if campaign["rate"] is not None:
+            details += f" | {campaign['rate']:.1f}/min"
+        if campaign["eta"]:
+            details += f" | ETA {campaign['eta'].strftime('%Y-%m-%d %H:%M')}"
+        if cid in usage:
+            tokens = usage[cid]["prompt_tokens"] + usage[cid]["response_tokens"]
+            details += f" | {tokens:,} tokens (${usage[cid]['cost_usd']:.2f})"
+        st.caption(details)
+        if st.button("🛑 Cancel Campaign", key=f"cancel_{cid}"):
+            count = cancel_campaign(cid)
+            st.success(f"Canceled {count} scheduled emails for campaign {cid[:8]}")
 
-# --- Active Campaign Controls ---
-st.sidebar.header("🎯 Active Campaigns")
+with st.sidebar:
+    campaign_dashboard()
 
-campaign_ids = set(info['campaign_id'] for info in get_all_jobs().values())
+# --- Pipeline Metrics ---
+stage_rows, error_counts = metrics.summary()
+if stage_rows or error_counts:
+    with st.sidebar.expander("📈 Pipeline Metrics"):
+        for row in stage_rows:
+            st.write(
+                f"**{row['stage'].replace('_', ' ')}**: {row['count']} | "
+                f"p50 {row['p50'] * 1000:.0f} ms | p95 {row['p95'] * 1000:.0f} ms"
+            )
+        for (provider, error_class), count in sorted(error_counts.items()):
+            st.write(f"⚠️ {provider}: {error_class} × {count}")
 
-for cid in sorted(campaign_ids):
-    if st.sidebar.button(f"Cancel Campaign {cid}"):
-        count = cancel_campaign(cid)
-        st.sidebar.success(f"🛑 Canceled {count} scheduled emails for Campaign ID: {cid}")
+# --- Dead Letters ---
+dead_letters = get_dead_letters()
+if dead_letters:
+    st.sidebar.header("☠️ Failed Sends")
+    st.sidebar.warning(f"{len(dead_letters)} emails failed after all retry attempts.")
+    with st.sidebar.expander("Show failed sends"):
+        for dead_letter in dead_letters[:50]:
+            st.write(f"{dead_letter['recipient']} | {dead_letter['attempts']} attempts | {dead_letter['last_error']}")
+    if st.sidebar.button("🔁 Re-send All Failed Emails"):
+        count = resend_dead_letters()
+        st.sidebar.success(f"Re-queued {count} emails.")
 
 # --- Sender Details ---
 st.header("Sender Details")
@@ -64,15 +192,24 @@ else:
     )
     upload_file = st.file_uploader("Upload file", type=["csv", "xlsx"])
     if upload_file:
-        if upload_file.name.endswith(".csv"):
-            df = pd.read_csv(upload_file)
-        else:
-            df = pd.read_excel(upload_file)
-        if "Names" not in df.columns or "Emails" not in df.columns:
-            st.error("Uploaded file must contain columns: Names, Emails")
-            st.stop()
-        email_targets = df.dropna(subset=["Names", "Emails"]).to_dict(orient="records")
+        # Streamlit reruns the script on every interaction; only re-read the file when a new one is uploaded
+        upload_key = (upload_file.name, upload_file.size, getattr(upload_file, "file_id", None))
+        if st.session_state.get("contacts_upload_key") != upload_key:
+            try:
+                st.session_state.contacts = load_contacts(upload_file, upload_file.name)
+            except ValueError as e:
+                st.error(str(e))
+                st.stop()
+            st.session_state.contacts_upload_key = upload_key
+        email_targets, ingest_report = st.session_state.contacts
         st.success(f"{len(email_targets)} contacts loaded.")
+        if ingest_report.rejected:
+            st.warning(
+                f"Skipped {ingest_report.rejected} of {ingest_report.total_rows} rows: "
+                f"{ingest_report.missing_fields} missing a name or email, "
+                f"{ingest_report.invalid_emails} invalid email, "
+                f"{ingest_report.duplicates} duplicate."
+            )
     else:
         email_targets = []
 
@@ -95,13 +232,41 @@ if recipient_mode == "One person" or (recipient_mode == "Many people (CSV/Excel
 
     # AI-Generated image description if enabled
     use_ai_img_desc = st.checkbox("Let AI generate the email image description from other fields", value=True)
-    if use_ai_img_desc and topic and context:
-        ai_image_description = generate_image_description_with_gemini(topic=topic, context=context, goal=goal)
-        st.info(f"AI Image Description: {ai_image_description}")
+    ai_image_description = None
+    if use_ai_img_desc:
+        # Generated on request only, so typing elsewhere on the form never waits on Gemini
+        description_inputs = (topic, context, goal)
+        if st.button("✨ Generate Image Description", disabled=not (topic and context)):
+            with st.spinner("Generating image description..."):
+                try:
+                    st.session_state.ai_image_description = (description_inputs, cached_image_description(*description_inputs))
+                except Exception:
+                    st.warning("Couldn't generate an image description; using a generic one. Try again to retry Gemini.")
+                    st.session_state.ai_image_description = (description_inputs, IMAGE_DESCRIPTION_FALLBACK)
+        if st.session_state.get("ai_image_description"):
+            generated_inputs, ai_image_description = st.session_state.ai_image_description
+            st.info(f"AI Image Description: {ai_image_description}")
+            if generated_inputs != description_inputs:
+                st.warning("Topic, context or goal changed since this description was generated. Generate it again to update it.")
+        else:
+            st.caption("Fill in the topic and context, then generate the image description.")
         image_description = ai_image_description
     else:
         image_description = st.text_input("Image Description", placeholder="Describe the visual to generate")
 
+    # Generation mode: one Gemini call per recipient, or a few drafts personalized locally
+    generation_mode = st.radio(
+        "Generation Mode",
+        ["Personalize each email with AI", "Generate a few drafts, personalize locally", ON_DEMAND_MODE],
+        help=(
+            "Local personalization makes only a handful of AI calls for the whole list, which suits large uploads. "
+            "On-demand mode generates the emails on the review page you are viewing plus a random sample; "
+            "the rest are generated when you schedule."
+        )
+    )
+    if generation_mode == "Generate a few drafts, personalize locally":
+        variant_count = st.slider("Number of Draft Variants", 1, 10, 3)
+
     # Batch scheduling controls
     total_emails = st.slider("Total Emails to Send (per recipient)", 1, 20, 1)
     start_date = st.date_input("Start Date", datetime.now().date())
@@ -109,6 +274,23 @@ if recipient_mode == "One person" or (recipient_mode == "Many people (CSV/Excel
     end_date = st.date_input("End Date", (datetime.now() + timedelta(days=1)).date())
     end_time = st.time_input("End Time", (datetime.now() + timedelta(hours=1)).time())
 
+    # Pre-run estimate; on-demand mode ends up generating every email too, just later
+    if topic and goal and email_targets:
+        estimate_fields = {"email_topic": topic, "tone": tone, "context": context or "None provided", "goal": goal}
+        if generation_mode == "Generate a few drafts, personalize locally":
+            sample_prompt = build_variant_prompts(EMAIL_PROMPT_TEMPLATES[template_type], variant_count, **estimate_fields)[0]
+            estimate = estimate_generation(sample_prompt, variant_count, batch_size=1)
+        else:
+            sample_prompt = EMAIL_PROMPT_TEMPLATES[template_type].format(
+                recipient_name=email_targets[0]["Names"], **estimate_fields
+            )
+            estimate = estimate_generation(sample_prompt, len(email_targets))
+        st.caption(
+            f"Estimated generation: {estimate['calls']} Gemini calls, "
+            f"~{estimate['prompt_tokens'] + estimate['response_tokens']:,} tokens, "
+            f"~${estimate['cost_usd']:.2f}, ~{timedelta(seconds=round(estimate['seconds']))}"
+        )
+
     if st.button("Generate & Preview Emails"):
         if not (topic and goal and (image_description or ai_image_description) and sender_name and sender_title and sender_contact):
             st.error("Please complete all required fields (including sender details and at least one description).")
@@ -118,39 +300,64 @@ if recipient_mode == "One person" or (recipient_mode == "Many people (CSV/Excel
         with st.spinner("Generating email previews..."):
             start_dt = datetime.combine(start_date, start_time)
             end_dt = datetime.combine(end_date, end_time)
-            email_previews = []
-
-            for entry in email_targets:
-                # Prepare prompt
-                prompt = EMAIL_PROMPT_TEMPLATES[template_type].format(
-                    recipient_name=entry["Names"],
-                    email_topic=topic,
-                    tone=tone,
-                    context=context if context else "None provided",
-                    goal=goal
+            email_previews = [None] * len(email_targets)
+            fields = {
+                "email_topic": topic,
+                "tone": tone,
+                "context": context if context else "None provided",
+                "goal": goal
+            }
+            st.session_state.generation_params = {
+                "targets": email_targets,
+                "template_type": template_type,
+                "fields": fields,
+                "image_description": image_description,
+                # Chosen now so generation token usage is booked to the campaign that gets scheduled
+                "campaign_id": str(uuid.uuid4())
+            }
+            campaign_id = st.session_state.generation_params["campaign_id"]
+            st.session_state.sample_indices = []
+
+            def build_prompt(entry):
+                return EMAIL_PROMPT_TEMPLATES[template_type].format(recipient_name=entry["Names"], **fields)
+
+            if generation_mode == ON_DEMAND_MODE:
+                # Only the first review page and a random sample are generated now
+                first_page = list(range(min(REVIEW_PAGE_SIZE, len(email_targets))))
+                rest = range(len(first_page), len(email_targets))
+                st.session_state.sample_indices = sorted(random.sample(rest, min(REVIEW_SAMPLE_SIZE, len(rest))))
+                st.session_state.email_previews = email_previews
+                fill_previews(first_page + st.session_state.sample_indices, show_progress=True, stream_first=STREAM_PREVIEW_COUNT)
+            elif generation_mode == "Generate a few drafts, personalize locally":
+                preview_stream = generate_variant_previews(
+                    email_targets,
+                    EMAIL_PROMPT_TEMPLATES[template_type],
+                    variant_count,
+                    image_description,
+                    campaign_id=campaign_id,
+                    **fields
                 )
-                email_text = generate_email_with_gemini(prompt)
-                # Split subject/body on first line
-                subject, body = email_text.split('\n', 1) if '\n' in email_text else ("No Subject", email_text)
-                img_path, fallback_description = generate_image(image_description)
-
-                # Handle image generation failure
-                if img_path is None:
-                    st.error("Failed to generate or download a fallback image. Please try again.")
+            else:
+                preview_stream = generate_previews(
+                    email_targets, build_prompt, image_description, campaign_id=campaign_id, stream_first=STREAM_PREVIEW_COUNT
+                )
+
+            if generation_mode != ON_DEMAND_MODE:
+                try:
+                    for idx, preview in render_preview_stream(preview_stream, len(email_targets)):
+                        # Handle image generation failure
+                        if preview["img_path"] is None:
+                            st.error("Failed to generate or download a fallback image. Please try again.")
+                            st.stop()
+
+                        # Store preview data in recipient order; it was shown as soon as it arrived
+                        email_previews[idx] = preview
+                except (RuntimeError, ValueError) as e:
+                    st.error(f"Email generation failed: {e}")
                     st.stop()
 
-                # Store preview data
-                email_previews.append({
-                    "recipient_name": entry["Names"],
-                    "recipient_email": entry["Emails"],
-                    "subject": subject.strip(),
-                    "body": body.strip(),
-                    "img_path": img_path,
-                    "fallback_description": fallback_description
-                })
-
-            # Save to session state
-            st.session_state.email_previews = email_previews
+                # Save to session state
+                st.session_state.email_previews = email_previews
             st.session_state.generation_done = True
             st.success("✅ Emails generated! Review and edit them below.")
 
@@ -159,8 +366,33 @@ if recipient_mode == "One person" or (recipient_mode == "Many people (CSV/Excel
         st.header("📝 Review & Edit Your Emails")
         st.info("✏️ You can edit the subject and body of each email before sending. Changes are automatically saved.")
         
-        for idx, preview in enumerate(st.session_state.email_previews):
+        email_previews = st.session_state.email_previews
+        review_view = "All emails"
+        if st.session_state.sample_indices:
+            review_view = st.radio("Review", ["All emails", "Random sample"], horizontal=True)
+        review_indices = st.session_state.sample_indices if review_view == "Random sample" else range(len(email_previews))
+
+        # Only the current page is rendered (and, in on-demand mode, generated)
+        page_count = max(1, -(-len(review_indices) // REVIEW_PAGE_SIZE))
+        page = st.number_input(
+            f"Page (1-{page_count})", min_value=1, max_value=page_count, value=1, step=1,
+            key=f"review_page_{review_view}"
+        )
+        page_indices = review_indices[(page - 1) * REVIEW_PAGE_SIZE:page * REVIEW_PAGE_SIZE]
+        if any(email_previews[idx] is None for idx in page_indices):
+            with st.spinner("Generating emails for this page..."):
+                fill_previews(page_indices)
+        not_generated = sum(preview is None for preview in email_previews)
+        st.caption(
+            f"Showing {len(page_indices)} of {len(review_indices)} emails."
+            + (f" {not_generated} emails will be generated when you schedule." if not_generated else "")
+        )
+
+        for idx in page_indices:
+            preview = email_previews[idx]
             with st.expander(f"✉️ Email for {preview['recipient_name']} <{preview['recipient_email']}>", expanded=True):
+                if preview.get("error"):
+                    st.error(f"Generation failed ({preview['error']}). Write this email below, or it won't be scheduled.")
                 st.subheader("Subject Line")
                 # Editable subject
                 edited_subject = st.text_input(
@@ -198,29 +430,57 @@ if recipient_mode == "One person" or (recipient_mode == "Many people (CSV/Excel
                 start_dt = datetime.combine(start_date, start_time)
                 end_dt = datetime.combine(end_date, end_time)
                 scheduled_emails = 0
-                
-                for preview in st.session_state.email_previews:
-                    campaign_id = str(uuid.uuid4())
+                scheduled_recipients = 0
+                skipped = 0
+                # One campaign for the whole run, so it is tracked and cancelled as a unit
+                campaign_id = st.session_state.generation_params["campaign_id"]
+
+                # On-demand mode: generate whatever was never viewed before scheduling it
+                fill_previews(range(len(st.session_state.email_previews)), show_progress=True)
+
+                # Staggers every recipient's sends across the window instead of sending them in lockstep
+                planner = SendPlanner(start_dt, end_dt, len(st.session_state.email_previews), total_emails, seed=campaign_id)
+                for idx, preview in enumerate(st.session_state.email_previews):
+                    # A failed generation is only sent if someone wrote the email by hand
+                    if preview.get("error") and not preview["body"].strip():
+                        skipped += 1
+                        continue
                     # Schedule batch emails for this recipient
                     schedule_batch_emails(
                         send_func=send_test_email,
+                        bulk_send_func=send_bulk_emails,
                         start_datetime=start_dt,
                         end_datetime=end_dt,
                         total_emails=total_emails,
+                        send_times=planner.send_times(idx),
                         campaign_id=campaign_id,
                         recipient=preview["recipient_email"],
                         subject=preview["subject"],
                         body=preview["body"],
-                        image_path=preview["img_path"],
+                        image_path=pin_image(preview["img_path"], campaign_id),
                         sender_name=sender_name,
                         sender_title=sender_title,
                         sender_contact=sender_contact
                     )
                     scheduled_emails += total_emails
+                    scheduled_recipients += 1
+                # Every send is in the store now; the campaign may be cleaned up once they finish
+                seal_campaign(campaign_id)
                 
-                st.success(f"✅ {scheduled_emails} emails scheduled for {len(email_targets)} recipients.")
+                st.success(
+                    f"✅ {scheduled_emails} emails scheduled for {scheduled_recipients} recipients "
+                    f"(campaign {campaign_id[:8]})."
+                )
+                if skipped:
+                    st.warning(f"{skipped} recipients were skipped because their email failed to generate.")
+                if planner.stretched:
+                    st.warning(
+                        f"Sending runs until {planner.end.strftime('%Y-%m-%d %H:%M')}, past the end time, "
+                        f"to stay within the send rate limits (SEND_MAX_PER_MINUTE / SEND_BURST_SIZE)."
+                    )
                 
                 # Reset state
                 st.session_state.email_previews = []
+                st.session_state.sample_indices = []
                 st.session_state.generation_done = False
                 st.balloons()
@@ -0,0 +1,241 @@
+"""
+Offline end-to-end campaign benchmark: generation -> scheduling -> sending, with fake providers.
+
+    python benchmarks/campaign_benchmark.py --recipients 100,1000,10000
+    python benchmarks/campaign_benchmark.py --recipients 1000 --gemini-latency-ms 800 --mailjet-429-rate 0.05
+    python benchmarks/campaign_benchmark.py --recipients 100 --stream-first 3
+
+Every run uses a throwaway directory for the job store, response cache and image cache.
+Nothing is sent over the network. For each stage it reports throughput, latency percentiles
+and peak traced memory. Provider rate limits are lifted (--provider-rate) unless you set them
+lower to see how throttling shapes throughput.
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import tracemalloc
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class LatencySamples:
+    def __init__(self):
+        self.samples = []
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentiles(self):
+        if not self.samples:
+            return "-"
+        ordered = sorted(self.samples)
+        pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000
+        return f"p50 {pick(0.5):.1f} ms | p90 {pick(0.9):.1f} ms | p99 {pick(0.99):.1f} ms | max {ordered[-1] * 1000:.1f} ms"
+
+
+def timed(func, samples):
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            samples.add(time.perf_counter() - start)
+    return wrapper
+
+
+class Stage:
+    """
+    Context manager timing one stage and recording its peak traced memory.
+    """
+
+    def __init__(self, name, items, track_memory):
+        self.name = name
+        self.items = items
+        self.track_memory = track_memory
+        self.latency = LatencySamples()
+
+    def __enter__(self):
+        if self.track_memory:
+            tracemalloc.reset_peak()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self.started
+        self.peak_mb = tracemalloc.get_traced_memory()[1] / 1e6 if self.track_memory else None
+
+    def report(self):
+        memory = f"{self.peak_mb:.1f} MB peak" if self.peak_mb is not None else "memory not tracked"
+        print(
+            f"  {self.name:<10} {self.items / self.seconds:>10.1f} /s  {self.seconds:>8.2f} s  {memory}\n"
+            f"  {'':<10} {self.latency.percentiles()}"
+        )
+
+
+def configure_environment(args, workdir):
+    # Must run before any helper is imported: they read their settings at import time
+    os.environ.update({
+        "JOB_STORE_PATH": os.path.join(workdir, "scheduler.db"),
+        "GEMINI_CACHE_PATH": os.path.join(workdir, "gemini_cache.db"),
+        "IMAGE_CACHE_DIR": os.path.join(workdir, "generated_images"),
+        "SENDER_MAIL": "bench@example.com",
+        "RETRY_BASE_DELAY_SECONDS": "3600",
+    })
+    if not args.with_cache:
+        os.environ["GEMINI_CACHE_DISABLED"] = "1"
+    if args.provider_rate:
+        for provider in ("GEMINI", "HUGGINGFACE", "MAILJET"):
+            os.environ.setdefault(f"{provider}_RATE_PER_SEC", str(args.provider_rate))
+            os.environ.setdefault(f"{provider}_BURST", str(args.provider_rate))
+
+
+def run_campaign(recipients, args, provider_latency):
+    from helper import job_store
+    from helper.prompt_templates import EMAIL_PROMPT_TEMPLATES
+    from helper.generation_pipeline import generate_previews, estimate_generation
+    from helper.token_usage import get_campaign_usage
+    from helper.mailjet_helper import send_test_email, send_bulk_emails
+    from helper.scheduler_helper import schedule_batch_emails, dispatch_due_sends
+
+    campaign_id = f"bench-{recipients}-{int(time.time())}"
+    template = EMAIL_PROMPT_TEMPLATES[args.template]
+    targets = [{"Names": f"Recipient {i}", "Emails": f"recipient{i}@example.com"} for i in range(recipients)]
+
+    def build_prompt(entry):
+        return template.format(
+            recipient_name=entry["Names"], email_topic="our new analytics product",
+            tone="friendly", context="Launch week", goal="Book a 15-minute demo"
+        )
+
+    print(f"\n== {recipients} recipients ==")
+    estimate = estimate_generation(build_prompt(targets[0]), recipients)
+    stages = []
+
+    with Stage("generate", recipients, not args.no_memory) as stage:
+        previews = []
+        first_content = None
+        for _, preview in generate_previews(
+            targets, build_prompt, "A team celebrating a product launch", campaign_id=campaign_id, stream_first=args.stream_first
+        ):
+            if first_content is None:
+                first_content = time.perf_counter() - stage.started
+            if preview.get("partial"):
+                continue
+            stage.latency.add(time.perf_counter() - stage.started)
+            previews.append(preview)
+    stages.append(stage)
+
+    # Everything is due immediately so the dispatcher can drain it in the next stage
+    send_at = datetime.now() - timedelta(seconds=1)
+    with Stage("schedule", recipients, not args.no_memory) as stage:
+        for preview in previews:
+            started = time.perf_counter()
+            schedule_batch_emails(
+                send_func=send_test_email,
+                bulk_send_func=send_bulk_emails,
+                start_datetime=send_at,
+                end_datetime=send_at,
+                total_emails=1,
+                campaign_id=campaign_id,
+                recipient=preview["recipient_email"],
+                subject=preview["subject"],
+                body=preview["body"],
+                image_path=preview["img_path"],
+                sender_name="Bench",
+                sender_title="Benchmark",
+                sender_contact="bench@example.com"
+            )
+            stage.latency.add(time.perf_counter() - started)
+    stages.append(stage)
+    del previews
+
+    with Stage("send", recipients, not args.no_memory) as stage:
+        dispatch_due_sends()
+    # Per bulk Mailjet request, including any rate-limiter wait
+    stage.latency = provider_latency["mailjet"]
+    stages.append(stage)
+
+    for stage in stages:
+        stage.report()
+    if first_content is not None:
+        print(f"  first      content after {first_content * 1000:.1f} ms (streaming the first {args.stream_first})")
+    counts = job_store.get_campaign_counts(campaign_id) or {"scheduled": 0}
+    dead = len(job_store.get_dead_letters(campaign_id))
+    print(f"  outcome    {counts['scheduled']} queued for retry, {dead} dead-lettered")
+    print(f"  gemini     {provider_latency['gemini'].percentiles()}  (per call, incl. rate-limit wait)")
+    usage = get_campaign_usage(campaign_id).get(campaign_id, {"calls": 0, "prompt_tokens": 0, "response_tokens": 0})
+    print(
+        f"  tokens     {usage['calls']} calls, {usage['prompt_tokens']} prompt + {usage['response_tokens']} response "
+        f"(estimated {estimate['calls']} calls, {estimate['prompt_tokens']} + {estimate['response_tokens']})"
+    )
+    for samples in provider_latency.values():
+        samples.samples.clear()
+    job_store.delete_campaign(campaign_id)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline campaign benchmark with fake providers.")
+    parser.add_argument("--recipients", default="100,1000", help="Comma-separated campaign sizes")
+    parser.add_argument("--template", default="introduction")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--provider-rate", type=float, default=100000.0,
+                        help="Requests/s allowed per provider by the rate limiter (0 keeps the configured limits)")
+    parser.add_argument("--with-cache", action="store_true", help="Keep the Gemini response cache on")
+    parser.add_argument("--stream-first", type=int, default=0, help="Stream the first N emails, as the app does")
+    parser.add_argument("--no-memory", action="store_true", help="Skip tracemalloc (it slows everything down)")
+    for provider, latency in (("gemini", 600), ("image", 2000), ("mailjet", 150)):
+        parser.add_argument(f"--{provider}-latency-ms", type=float, default=latency)
+        parser.add_argument(f"--{provider}-error-rate", type=float, default=0.0)
+        parser.add_argument(f"--{provider}-429-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after-ms", type=float, default=100.0)
+    args = parser.parse_args(argv)
+
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix="outreach-bench-")
+    configure_environment(args, workdir)
+
+    from benchmarks.fake_providers import ProviderProfile, install
+    from helper import gemini_helper, mailjet_helper
+    from helper.prompt_templates import EMAIL_PROMPT_TEMPLATES
+    if args.template not in EMAIL_PROMPT_TEMPLATES:
+        parser.error(f"--template must be one of {', '.join(EMAIL_PROMPT_TEMPLATES)}")
+
+    profile = lambda name: ProviderProfile(
+        getattr(args, f"{name}_latency_ms"), getattr(args, f"{name}_error_rate"),
+        getattr(args, f"{name}_429_rate"), args.retry_after_ms
+    )
+    counters = install(gemini=profile("gemini"), huggingface=profile("image"), mailjet=profile("mailjet"))
+
+    # Time provider calls as the helpers see them, including any rate-limiter wait
+    provider_latency = {"gemini": LatencySamples(), "mailjet": LatencySamples()}
+    gemini_helper.rate_limited_call = timed(gemini_helper.rate_limited_call, provider_latency["gemini"])
+    mailjet_helper._post_messages = timed(mailjet_helper._post_messages, provider_latency["mailjet"])
+
+    if not args.no_memory:
+        tracemalloc.start()
+    print(f"Working directory: {workdir}")
+    for recipients in (int(size) for size in args.recipients.split(",")):
+        run_campaign(recipients, args, provider_latency)
+    print(f"\nProvider calls by outcome: {counters.snapshot()}")
+
+    from helper import metrics
+    stage_rows, error_counts = metrics.summary()
+    print("\nPipeline metrics (all runs):")
+    for row in stage_rows:
+        print(f"  {row['stage']:<18} {row['count']:>8}  p50 {row['p50'] * 1000:.1f} ms  p95 {row['p95'] * 1000:.1f} ms")
+    if error_counts:
+        print(f"  errors: {error_counts}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
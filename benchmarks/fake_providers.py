@@ -0,0 +1,202 @@
+"""
+In-process stand-ins for Gemini, Hugging Face and Mailjet used by the offline benchmarks.
+
+install() swaps them in at the helpers' client seams (get_gemini_model, get_image_client,
+get_mailjet_client). Everything above those seams runs unchanged: rate limiting, caching,
+batching, retries and the job store. Each provider takes a ProviderProfile with simulated
+latency, a random error rate and a random 429 rate.
+"""
+
+import re
+import json
+import time
+import random
+import threading
+from dataclasses import dataclass
+
+
+@dataclass
+class ProviderProfile:
+    latency_ms: float = 0.0
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    retry_after_ms: float = 100.0
+
+    def delay(self):
+        # Roughly latency_ms (+/-50%), in seconds
+        return self.latency_ms * random.uniform(0.5, 1.5) / 1000
+
+    def simulate(self, sleep=True):
+        """
+        Sleeps for roughly latency_ms (+/-50%) and returns "ok", "error" or "rate_limited".
+        With sleep=False the caller spends the latency itself (e.g. spread over a stream).
+        """
+        if self.latency_ms and sleep:
+            time.sleep(self.delay())
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            return "rate_limited"
+        if roll < self.rate_limit_rate + self.error_rate:
+            return "error"
+        return "ok"
+
+
+class ResourceExhausted(Exception):
+    # Same name and code as the google.api_core exception the rate limiter recognises
+    code = 429
+
+
+class FakeUsageMetadata:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class FakeGeminiResponse:
+    def __init__(self, text, prompt=""):
+        self.text = text
+        # Roughly four characters per token, like the real tokenizer on English text
+        self.usage_metadata = FakeUsageMetadata(len(prompt) // 4, len(text) // 4)
+
+
+class FakeGeminiStream:
+    """
+    Iterates like a streamed GenerateContentResponse: a first chunk after a tenth of the latency,
+    then the rest of the text a few words at a time over the remainder.
+    """
+
+    def __init__(self, text, prompt, seconds):
+        self.text = text
+        self.usage_metadata = FakeUsageMetadata(len(prompt) // 4, len(text) // 4)
+        self.seconds = seconds
+
+    def __iter__(self):
+        words = self.text.split(" ")
+        pieces = [" ".join(words[i:i + 8]) + (" " if i + 8 < len(words) else "") for i in range(0, len(words), 8)]
+        time.sleep(self.seconds / 10)
+        for piece in pieces:
+            yield FakeGeminiResponse(piece)
+            time.sleep(self.seconds * 0.9 / len(pieces))
+
+
+class FakeGeminiModel:
+    BODY = (
+        "I hope this message finds you well. I wanted to reach out about something I think "
+        "will be genuinely useful for you and your team. " * 4
+    ).strip()
+
+    def __init__(self, profile, counters, system_instruction=None):
+        self.profile = profile
+        self.counters = counters
+        self.system_instruction = system_instruction or ""
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kwargs):
+        outcome = self.profile.simulate(sleep=not stream)
+        self.counters.add("gemini", outcome)
+        if outcome == "rate_limited":
+            raise ResourceExhausted("429 Resource has been exhausted")
+        if outcome == "error":
+            raise RuntimeError("500 Internal error (simulated)")
+
+        if generation_config and generation_config.get("response_mime_type") == "application/json":
+            match = re.search(r"You will write (\d+) separate emails", prompt)
+            count = int(match.group(1)) if match else 1
+            return FakeGeminiResponse(json.dumps([
+                {"id": n, "subject": f"A quick idea for you ({n})", "body": self.BODY} for n in range(count)
+            ]), self.system_instruction + prompt)
+        text = f"Subject: A quick idea for you\n{self.BODY}"
+        if stream:
+            return FakeGeminiStream(text, self.system_instruction + prompt, self.profile.delay())
+        return FakeGeminiResponse(text, self.system_instruction + prompt)
+
+
+class FakeImageClient:
+    def __init__(self, profile, counters, size=(1024, 1024)):
+        self.profile = profile
+        self.counters = counters
+        self.size = size
+
+    def text_to_image(self, prompt, model=None, **kwargs):
+        from PIL import Image
+
+        outcome = self.profile.simulate()
+        self.counters.add("huggingface", outcome)
+        if outcome == "rate_limited":
+            error = RuntimeError("429 Too Many Requests")
+            error.code = 429
+            raise error
+        if outcome == "error":
+            raise RuntimeError("500 Internal error (simulated)")
+        return Image.new("RGB", self.size, color=(random.randrange(256), 120, 200))
+
+
+class FakeMailjetResponse:
+    def __init__(self, status_code, payload, headers=None):
+        self.status_code = status_code
+        self._payload = payload
+        self.headers = headers or {}
+
+    def json(self):
+        return self._payload
+
+
+class FakeMailjetSession:
+    def __init__(self, profile, counters):
+        self.profile = profile
+        self.counters = counters
+
+    def post(self, url, data=None, headers=None, auth=None, timeout=None):
+        messages = json.loads(data)["Messages"]
+        outcome = self.profile.simulate()
+        self.counters.add("mailjet", outcome, len(messages))
+        if outcome == "rate_limited":
+            return FakeMailjetResponse(
+                429, {"ErrorMessage": "Too many requests"},
+                {"Retry-After": str(self.profile.retry_after_ms / 1000)}
+            )
+        if outcome == "error":
+            return FakeMailjetResponse(500, {"ErrorMessage": "Internal error (simulated)"})
+        return FakeMailjetResponse(200, {"Messages": [
+            {"Status": "success", "To": [{"Email": message["To"][0]["Email"]}]} for message in messages
+        ]})
+
+
+class FakeMailjetClient:
+    def __init__(self):
+        self.config = {"send": ("https://api.mailjet.invalid/v3.1/send", {"Content-type": "application/json"})}
+        self.auth = ("benchmark", "benchmark")
+
+
+class CallCounters:
+    """
+    Thread-safe {provider: {outcome: count}} tally of simulated provider calls.
+    """
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def add(self, provider, outcome, amount=1):
+        with self._lock:
+            provider_counts = self._counts.setdefault(provider, {})
+            provider_counts[outcome] = provider_counts.get(outcome, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return {provider: dict(counts) for provider, counts in self._counts.items()}
+
+
+def install(gemini, huggingface, mailjet):
+    """
+    Points the helpers at fake providers with the given ProviderProfiles. Returns the CallCounters.
+    """
+    from helper import gemini_helper, image_generator, mailjet_helper
+
+    counters = CallCounters()
+    image_client = FakeImageClient(huggingface, counters)
+    mailjet_client, mailjet_session = FakeMailjetClient(), FakeMailjetSession(mailjet, counters)
+
+    gemini_helper.get_gemini_model = lambda system_instruction=None: FakeGeminiModel(gemini, counters, system_instruction)
+    image_generator.get_image_client = lambda: image_client
+    mailjet_helper.get_mailjet_client = lambda: (mailjet_client, mailjet_session)
+    return counters
@@ -0,0 +1,91 @@
+"""
+Import-time benchmark for the helper modules.
+
+    python benchmarks/import_time.py [--budget-ms 300] [--runs 5]
+
+Each module is imported in a fresh interpreter. The script reports the median wall time and
+fails (exit 1) if a module goes over budget or pulls in a provider SDK, pandas or the scheduler
+at import time. Those are meant to load on first use, so startup cost doesn't creep back up.
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = [
+    "helper.gemini_helper",
+    "helper.image_generator",
+    "helper.image_optimizer",
+    "helper.mailjet_helper",
+    "helper.contact_ingest",
+    "helper.generation_pipeline",
+    "helper.scheduler_helper",
+    "outreach_cli",
+]
+
+# Packages that must stay out of sys.modules until they are first used
+LAZY_PACKAGES = [
+    "google.generativeai",
+    "huggingface_hub",
+    "mailjet_rest",
+    "pandas",
+    "openpyxl",
+    "PIL",
+    "apscheduler.schedulers",
+    "sqlalchemy",
+]
+
+PROBE = """
+import sys, json, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+lazy = {lazy!r}
+print(json.dumps({{"seconds": elapsed, "loaded": [name for name in lazy if name in sys.modules]}}))
+"""
+
+
+def measure(module, runs):
+    timings, loaded = [], set()
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, lazy=LAZY_PACKAGES)],
+            cwd=ROOT, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            return None, result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed"
+        sample = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(sample["seconds"])
+        loaded.update(sample["loaded"])
+    return statistics.median(timings), sorted(loaded)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_BUDGET_MS", "300")))
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("modules", nargs="*", default=MODULES)
+    args = parser.parse_args(argv)
+
+    failures = 0
+    print(f"{'module':<32} {'median ms':>10}  eagerly loaded")
+    for module in args.modules:
+        seconds, detail = measure(module, args.runs)
+        if seconds is None:
+            print(f"{module:<32} {'error':>10}  {detail}")
+            failures += 1
+            continue
+        over_budget = seconds * 1000 > args.budget_ms
+        failures += over_budget or bool(detail)
+        flag = "  OVER BUDGET" if over_budget else ""
+        print(f"{module:<32} {seconds * 1000:>10.1f}  {', '.join(detail) or '-'}{flag}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,9 @@
+# The other test_*.py scripts at the repo root are live smoke checks run by hand (python test_mailjet.py):
+# they call Mailjet, Gemini and Hugging Face at import, so pytest must never collect them.
+collect_ignore = [
+    "test_email_campaign.py",
+    "test_gemini.py",
+    "test_image.py",
+    "test_mailjet.py",
+    "test_schedule.py",
+]
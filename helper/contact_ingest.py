@@ -0,0 +1,140 @@
+# helper/contact_ingest.py
+
+import os
+import re
+import hashlib
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+INGEST_CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", "10000"))
+REQUIRED_COLUMNS = ("Names", "Emails")
+
+# Pragmatic address check: one @, no whitespace, a dotted domain with a 2+ letter TLD
+EMAIL_PATTERN = re.compile(r"^[A-Za-z0-9.!#$%&'*+/=?^_`{|}~-]+@[A-Za-z0-9](?:[A-Za-z0-9-]*[A-Za-z0-9])?(?:\.[A-Za-z0-9](?:[A-Za-z0-9-]*[A-Za-z0-9])?)*\.[A-Za-z]{2,}$")
+
+
+@dataclass
+class IngestReport:
+    total_rows: int = 0
+    accepted: int = 0
+    missing_fields: int = 0
+    invalid_emails: int = 0
+    duplicates: int = 0
+
+    @property
+    def rejected(self):
+        return self.missing_fields + self.invalid_emails + self.duplicates
+
+
+def normalize_email(email):
+    # Domains are case-insensitive; the local part is kept as written apart from surrounding whitespace
+    email = str(email).strip().strip("<>").strip()
+    if "@" not in email:
+        return email
+    local, _, domain = email.rpartition("@")
+    return f"{local}@{domain.lower()}"
+
+
+def is_valid_email(email):
+    return len(email) <= 254 and EMAIL_PATTERN.match(email) is not None
+
+
+def email_key(email):
+    # 8-byte digests keep the seen-set small on million-row files
+    return hashlib.blake2b(email.lower().encode("utf-8"), digest_size=8).digest()
+
+
+def _read_chunks(source, filename, chunk_size):
+    # pandas is only needed once a file is uploaded, so it is not loaded at app startup
+    import pandas as pd
+
+    if filename.lower().endswith(".csv"):
+        yield from pd.read_csv(source, chunksize=chunk_size, dtype=str, usecols=lambda c: c in REQUIRED_COLUMNS)
+        return
+
+    # openpyxl's read-only mode streams rows instead of loading the whole workbook
+    from openpyxl import load_workbook
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else "" for cell in next(rows, ())]
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield pd.DataFrame(chunk, columns=header)
+                chunk = []
+        if chunk or not header:
+            yield pd.DataFrame(chunk, columns=header)
+    finally:
+        workbook.close()
+
+
+def iter_contacts(source, filename, report, chunk_size=INGEST_CHUNK_SIZE):
+    """
+    Streams {"Names", "Emails"} contacts from a CSV or Excel file (path or file-like) chunk by chunk.
+    Emails are normalized and validated, and later duplicates are dropped; counts go into report.
+    Raises ValueError if the file lacks the Names or Emails column.
+    Memory use is bounded by chunk_size plus the seen-set: an 8-byte digest per unique address,
+    which with Python's bytes and set overhead comes to roughly 80 bytes each.
+    """
+    import pandas as pd
+
+    seen = set()
+    for chunk in _read_chunks(source, filename, chunk_size):
+        missing_columns = [column for column in REQUIRED_COLUMNS if column not in chunk.columns]
+        if missing_columns:
+            raise ValueError(f"Uploaded file must contain columns: {', '.join(REQUIRED_COLUMNS)}")
+
+        for name, email in zip(chunk["Names"], chunk["Emails"]):
+            report.total_rows += 1
+            if pd.isna(name) or pd.isna(email) or not str(name).strip() or not str(email).strip():
+                report.missing_fields += 1
+                continue
+            email = normalize_email(email)
+            if not is_valid_email(email):
+                report.invalid_emails += 1
+                continue
+            key = email_key(email)
+            if key in seen:
+                report.duplicates += 1
+                continue
+            seen.add(key)
+            report.accepted += 1
+            yield {"Names": str(name).strip(), "Emails": email}
+
+
+class ContactList(Sequence):
+    """
+    Accepted contacts held as two parallel lists of strings rather than a dict per row, which
+    roughly halves the memory a large upload keeps in session state. Indexing returns a fresh
+    {"Names", "Emails"} dict, so callers use it like a list of contacts.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.emails = []
+
+    def append(self, contact):
+        self.names.append(contact["Names"])
+        self.emails.append(contact["Emails"])
+
+    def __len__(self):
+        return len(self.emails)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return {"Names": self.names[index], "Emails": self.emails[index]}
+
+
+def load_contacts(source, filename, chunk_size=INGEST_CHUNK_SIZE):
+    """
+    Returns (ContactList, IngestReport) for an uploaded contact file. Only names and emails are
+    kept; the dedupe set is dropped once the file has been read.
+    """
+    report = IngestReport()
+    contacts = ContactList()
+    for contact in iter_contacts(source, filename, report, chunk_size=chunk_size):
+        contacts.append(contact)
+    return contacts, report
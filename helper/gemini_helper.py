@@ -1,27 +1,166 @@
 # helper/gemini_helper.py
 
 import os
+import json
+import time
+import hashlib
+import threading
 from dotenv import load_dotenv
-import google.generativeai as genai
+
+from helper.response_cache import get_cached_response, store_response
+from helper.rate_limiter import rate_limited_call
+from helper.prompt_templates import EMAIL_SYSTEM_INSTRUCTION
+from helper.token_usage import record_usage
+from helper import metrics
 
 # Load .env
 load_dotenv()
 
-# Configure Gemini API key once
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+# Updated to use current stable model
+GEMINI_MODEL = "gemini-2.5-flash"
+# Failed calls come back as text starting with this marker instead of raising
+GEMINI_ERROR_PREFIX = "[Gemini API Error]:"
+
+_genai = None
+_genai_lock = threading.Lock()
+
+def get_gemini_model(system_instruction=None):
+    """
+    Returns a GenerativeModel for GEMINI_MODEL, with system_instruction sent as the shared prefix of
+    every request. The SDK is imported and configured on first use, so importing this module stays cheap.
+    """
+    global _genai
+    with _genai_lock:
+        if _genai is None:
+            import google.generativeai as genai
+            # Configure Gemini API key once
+            genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+            _genai = genai
+    return _genai.GenerativeModel(model_name=GEMINI_MODEL, system_instruction=system_instruction)
+
+def _cache_model(system_instruction, kind=""):
+    # Responses depend on the system instruction as well as the prompt, so it is part of the cache key
+    if not system_instruction:
+        return GEMINI_MODEL + kind
+    return f"{GEMINI_MODEL}{kind}:{hashlib.sha256(system_instruction.encode('utf-8')).hexdigest()[:12]}"
+
+# Number of recipients packed into one batched request
+GEMINI_BATCH_SIZE = int(os.getenv("GEMINI_BATCH_SIZE", "10"))
+
+BATCH_INSTRUCTION = (
+    "You will write {count} separate emails, one for each numbered request below. "
+    "Respond with only a JSON array containing exactly one object per request, in the form "
+    '{{"id": <request number>, "subject": "<subject line>", "body": "<email body>"}}. '
+    'Put the subject line only in "subject" and do not repeat it at the top of "body".\n\n'
+)
+
+def gemini_error(email_text):
+    """
+    Returns the error message if email_text is (or, when streamed, ends in) a failed call's error text, else None.
+    """
+    position = email_text.find(GEMINI_ERROR_PREFIX)
+    return email_text[position:].strip() if position != -1 else None
+
+def split_subject_body(email_text):
+    """
+    Splits plain-text Gemini output into (subject, body), using the first line as the subject.
+    A leading "Subject:" label and markdown emphasis are stripped from the subject.
+    """
+    subject, body = email_text.strip().split('\n', 1) if '\n' in email_text.strip() else ("No Subject", email_text)
+    subject = subject.strip().strip('*#').strip()
+    if subject.lower().startswith("subject:"):
+        subject = subject[len("subject:"):].strip()
+    return subject or "No Subject", body.strip()
 
 # Helper for email body
-def generate_email_with_gemini(prompt: str) -> str:
-    # Updated to use current stable model
-    model = genai.GenerativeModel(model_name="gemini-2.5-flash") 
+def generate_email_with_gemini(prompt: str, use_cache: bool = True, campaign_id=None,
+                               system_instruction=EMAIL_SYSTEM_INSTRUCTION) -> str:
+    cache_model = _cache_model(system_instruction)
+    if use_cache:
+        cached = get_cached_response(cache_model, prompt)
+        if cached is not None:
+            return cached
+    model = get_gemini_model(system_instruction)
+    try:
+        with metrics.timed("gemini_call", provider="gemini"):
+            response = rate_limited_call("gemini", model.generate_content, prompt)
+        record_usage(response, campaign_id)
+        email_text = response.text if hasattr(response, 'text') else str(response)
+    except Exception as e:
+        return f"{GEMINI_ERROR_PREFIX} {e}"
+    if use_cache:
+        store_response(cache_model, prompt, email_text)
+    return email_text
+
+def _chunk_text(chunk):
+    # Chunks carrying only a finish reason or safety ratings have no text; .text raises for them
     try:
-        response = model.generate_content(prompt)
-        return response.text if hasattr(response, 'text') else str(response)
+        return chunk.text
+    except (ValueError, AttributeError):
+        return ""
+
+# Streaming helper for email body
+def stream_email_with_gemini(prompt: str, use_cache: bool = True, campaign_id=None,
+                             system_instruction=EMAIL_SYSTEM_INSTRUCTION):
+    """
+    Streaming counterpart of generate_email_with_gemini: yields the email text in chunks as Gemini
+    produces them. A cached response comes back as one chunk, and an error is yielded as
+    "[Gemini API Error]: ..." text, the way generate_email_with_gemini returns it.
+    """
+    cache_model = _cache_model(system_instruction)
+    if use_cache:
+        cached = get_cached_response(cache_model, prompt)
+        if cached is not None:
+            yield cached
+            return
+    model = get_gemini_model(system_instruction)
+    chunks = []
+    try:
+        with metrics.timed("gemini_call", provider="gemini"):
+            started = time.perf_counter()
+            response = rate_limited_call("gemini", model.generate_content, prompt, stream=True)
+            for chunk in response:
+                text = _chunk_text(chunk)
+                if not text:
+                    continue
+                if not chunks:
+                    metrics.observe("gemini_first_token", time.perf_counter() - started, provider="gemini")
+                chunks.append(text)
+                yield text
+        record_usage(response, campaign_id)
     except Exception as e:
-        return f"[Gemini API Error]: {e}"
+        yield ("\n\n" if chunks else "") + f"{GEMINI_ERROR_PREFIX} {e}"
+        return
+    if use_cache:
+        store_response(cache_model, prompt, "".join(chunks))
+
+def stream_subject_body(chunks):
+    """
+    Incremental split_subject_body over streamed text: yields (subject, body) after every chunk.
+    subject is None until the first line is complete (body then holds that line so far); the last
+    pair yielded is always split_subject_body of the full text.
+    """
+    text = ""
+    subject = None
+    for chunk in chunks:
+        text += chunk
+        stripped = text.lstrip()
+        if subject is None and '\n' in stripped:
+            subject = split_subject_body(stripped)[0]
+        yield (subject, stripped.split('\n', 1)[1].lstrip()) if subject is not None else (None, stripped)
+    yield split_subject_body(text)
 
 # Helper for AI-generated image descriptions
-def generate_image_description_with_gemini(topic, context, goal) -> str:
+# Used when Gemini can't describe the image; never cached, so the next attempt asks Gemini again
+IMAGE_DESCRIPTION_FALLBACK = "Business meeting, handshake, office."
+
+def generate_image_description_with_gemini(topic, context, goal, use_cache: bool = True, campaign_id=None,
+                                           raise_on_error: bool = False) -> str:
+    """
+    Returns a photorealistic image description for the email. On a Gemini error it returns
+    IMAGE_DESCRIPTION_FALLBACK, or re-raises when raise_on_error is set so callers that memoize
+    the result don't keep the fallback.
+    """
     prompt = (
         f"Given the following email topic: '{topic}'.\n"
         f"Context: '{context}'.\n"
@@ -29,10 +168,100 @@ def generate_image_description_with_gemini(topic, context, goal) -> str:
         "Suggest a concise, vivid, photorealistic image description to visually represent this email, ready for image-generation AI. "
         "Do NOT use placeholder text. Write as a full descriptive sentence."
     )
+    if use_cache:
+        cached = get_cached_response(GEMINI_MODEL, prompt)
+        if cached is not None:
+            return cached
     try:
-        # Updated to use current stable model
-        model = genai.GenerativeModel(model_name="gemini-2.5-flash")
-        response = model.generate_content(prompt)
-        return response.text.replace('\n', ' ').strip()
+        model = get_gemini_model()
+        with metrics.timed("gemini_call", provider="gemini"):
+            response = rate_limited_call("gemini", model.generate_content, prompt)
+        record_usage(response, campaign_id, emails=0)
+        description = response.text.replace('\n', ' ').strip()
     except Exception as e:
-        return "Business meeting, handshake, office."
+        print(f"[Gemini Error]: Image description failed: {e}")
+        if raise_on_error:
+            raise
+        return IMAGE_DESCRIPTION_FALLBACK
+    if use_cache:
+        store_response(GEMINI_MODEL, prompt, description)
+    return description
+
+def _parse_batch_response(text):
+    # JSON mode should return a bare array, but tolerate a fenced code block
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip('`')
+        text = text[text.find('\n') + 1:] if '\n' in text else text
+    entries = json.loads(text)
+    if isinstance(entries, dict):
+        entries = [entries]
+    results = {}
+    for entry in entries if isinstance(entries, list) else []:
+        if not isinstance(entry, dict):
+            continue
+        try:
+            request_id = int(entry.get("id"))
+        except (TypeError, ValueError):
+            continue
+        subject, body = entry.get("subject"), entry.get("body")
+        if isinstance(subject, str) and isinstance(body, str) and body.strip():
+            results[request_id] = (subject.strip() or "No Subject", body.strip())
+    return results
+
+# Helper for many email bodies in one request
+def generate_emails_batch_with_gemini(prompts, max_attempts: int = 3, use_cache: bool = True, campaign_id=None,
+                                      system_instruction=EMAIL_SYSTEM_INSTRUCTION) -> list:
+    """
+    Generates one email per prompt, packing the prompts into a single JSON-mode request.
+    Returns a list aligned with prompts of (subject, body) tuples; entries the model still
+    failed to return after max_attempts are None. Only missing entries are re-requested.
+    """
+    cache_model = _cache_model(system_instruction, ":json")
+    results = [None] * len(prompts)
+    missing = []
+    for i, prompt in enumerate(prompts):
+        cached = get_cached_response(cache_model, prompt) if use_cache else None
+        if cached is not None:
+            results[i] = tuple(json.loads(cached))
+        else:
+            missing.append(i)
+
+    model = get_gemini_model(system_instruction)
+    for attempt in range(max_attempts):
+        if not missing:
+            break
+        batch_prompt = BATCH_INSTRUCTION.format(count=len(missing)) + "\n\n".join(
+            f"Request {n}:\n{prompts[i]}" for n, i in enumerate(missing)
+        )
+        try:
+            with metrics.timed("gemini_call", provider="gemini"):
+                response = rate_limited_call(
+                    "gemini",
+                    model.generate_content,
+                    batch_prompt,
+                    generation_config={"response_mime_type": "application/json"}
+                )
+        except Exception as e:
+            print(f"[Gemini API Error]: Batch of {len(missing)} failed on attempt {attempt + 1}: {e}")
+            continue
+        try:
+            parsed = _parse_batch_response(response.text)
+        except ValueError as e:
+            record_usage(response, campaign_id, emails=0)
+            metrics.record_error("gemini", "invalid_json")
+            print(f"[Gemini API Error]: Batch of {len(missing)} returned unusable JSON on attempt {attempt + 1}: {e}")
+            continue
+        record_usage(response, campaign_id, emails=sum(n in parsed for n in range(len(missing))))
+        still_missing = []
+        for n, i in enumerate(missing):
+            if n in parsed:
+                results[i] = parsed[n]
+                if use_cache:
+                    store_response(cache_model, prompts[i], json.dumps(parsed[n]))
+            else:
+                still_missing.append(i)
+        if still_missing:
+            metrics.record_error("gemini", "incomplete_batch")
+        missing = still_missing
+    return results
@@ -0,0 +1,186 @@
+# helper/generation_pipeline.py
+
+import os
+import math
+import queue
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from helper.gemini_helper import (
+    generate_email_with_gemini, generate_emails_batch_with_gemini, stream_email_with_gemini, stream_subject_body,
+    split_subject_body, gemini_error, GEMINI_BATCH_SIZE, BATCH_INSTRUCTION
+)
+from helper.prompt_templates import EMAIL_SYSTEM_INSTRUCTION
+from helper.rate_limiter import get_limiter
+from helper import token_usage
+from helper.image_generator import generate_image
+from helper.personalization import generate_variants, assign_variant, personalize
+from helper import metrics
+
+# Per-provider concurrency caps (each provider gets its own worker pool)
+GEMINI_CONCURRENCY = int(os.getenv("GEMINI_CONCURRENCY", "8"))
+IMAGE_CONCURRENCY = int(os.getenv("IMAGE_CONCURRENCY", "2"))
+# How often generate_previews passes on streamed text while it waits for work to finish
+STREAM_POLL_SECONDS = 0.05
+
+
+def _final_email(text):
+    # (subject, body, error): a failed generation keeps no text, so its error can never be sent as an email
+    error = gemini_error(text)
+    if error:
+        return "", "", error
+    return (*split_subject_body(text), None)
+
+
+def _generate_batch(prompts, campaign_id=None):
+    # Anything the batched request never returned falls back to one plain request per prompt
+    results = generate_emails_batch_with_gemini(prompts, campaign_id=campaign_id)
+    return [
+        (*result, None) if result is not None else _final_email(generate_email_with_gemini(prompt, campaign_id=campaign_id))
+        for prompt, result in zip(prompts, results)
+    ]
+
+
+def _stream_email(prompt, idx, updates, campaign_id=None):
+    # Hands every partial (subject, body) to the consuming thread; returns the final email like _generate_batch
+    chunks = []
+
+    def collect():
+        for chunk in stream_email_with_gemini(prompt, campaign_id=campaign_id):
+            chunks.append(chunk)
+            yield chunk
+
+    for subject, body in stream_subject_body(collect()):
+        updates.put((idx, subject, body))
+    return [_final_email("".join(chunks))]
+
+
+def generate_previews(email_targets, build_prompt, image_description, batch_size=GEMINI_BATCH_SIZE, campaign_id=None,
+                      stream_first=0):
+    """
+    Generate email previews for every target concurrently.
+    Targets are packed batch_size to a Gemini request, and Gemini and image calls run on separate
+    pools capped by GEMINI_CONCURRENCY and IMAGE_CONCURRENCY. Token usage is booked to campaign_id.
+    Yields (index, preview) as each batch finishes; index is the recipient's position in
+    email_targets so callers can keep results in recipient order. A preview whose generation failed
+    has an empty subject and body and the message in "error"; callers must not schedule it.
+    The first stream_first targets are instead requested one by one with streaming, and while their
+    text arrives they are also yielded as partial previews: "partial": True, subject None until its
+    line is complete, and no image yet. Their finished preview follows as usual.
+    """
+    gemini_pool = ThreadPoolExecutor(max_workers=GEMINI_CONCURRENCY)
+    image_pool = ThreadPoolExecutor(max_workers=IMAGE_CONCURRENCY)
+    try:
+        # Identical descriptions share one image call within a run; the on-disk cache covers later runs
+        image_futures = {}
+        pending = {}
+        indexed_targets = list(enumerate(email_targets))
+        streamed = min(max(0, stream_first), len(indexed_targets))
+        updates = queue.Queue()
+        batches = [indexed_targets[i:i + 1] for i in range(streamed)] + [
+            indexed_targets[start:start + max(1, batch_size)]
+            for start in range(streamed, len(indexed_targets), max(1, batch_size))
+        ]
+        for n, batch in enumerate(batches):
+            if image_description not in image_futures:
+                image_futures[image_description] = image_pool.submit(generate_image, image_description)
+            with metrics.timed("prompt_build"):
+                prompts = [build_prompt(entry) for _, entry in batch]
+            if n < streamed:
+                text_future = gemini_pool.submit(_stream_email, prompts[0], batch[0][0], updates, campaign_id)
+            else:
+                text_future = gemini_pool.submit(_generate_batch, prompts, campaign_id)
+            pending[text_future] = (batch, image_futures[image_description])
+
+        # A finished batch waits here until the image it shares with other recipients is ready
+        blocked = {}
+        waiting = set(pending) | set(image_futures.values())
+        while waiting:
+            done, waiting = wait(waiting, timeout=STREAM_POLL_SECONDS if streamed else None, return_when=FIRST_COMPLETED)
+            # Drained before finished work is handled, so an email's partial previews all come before its final one
+            latest = {}
+            while not updates.empty():
+                idx, subject, body = updates.get_nowait()
+                latest[idx] = (subject, body)
+            for idx, (subject, body) in latest.items():
+                entry = indexed_targets[idx][1]
+                yield idx, {
+                    "recipient_name": entry["Names"],
+                    "recipient_email": entry["Emails"],
+                    "subject": subject,
+                    "body": body,
+                    "img_path": None,
+                    "fallback_description": None,
+                    "partial": True
+                }
+            ready = []
+            for future in done:
+                if future in pending:
+                    batch, image_future = pending.pop(future)
+                    if image_future.done():
+                        ready.append((batch, future, image_future))
+                    else:
+                        blocked.setdefault(image_future, []).append((batch, future, image_future))
+                else:
+                    ready.extend(blocked.pop(future, []))
+
+            for batch, text_future, image_future in ready:
+                img_path, fallback_description = image_future.result()
+                for (idx, entry), (subject, body, error) in zip(batch, text_future.result()):
+                    yield idx, {
+                        "recipient_name": entry["Names"],
+                        "recipient_email": entry["Emails"],
+                        "subject": subject,
+                        "body": body,
+                        "img_path": img_path,
+                        "fallback_description": fallback_description,
+                        "error": error
+                    }
+    finally:
+        # Drop queued work if the caller stops consuming early (e.g. st.stop())
+        gemini_pool.shutdown(wait=False, cancel_futures=True)
+        image_pool.shutdown(wait=False, cancel_futures=True)
+
+
+def generate_variant_previews(email_targets, template, variant_count, image_description, campaign_id=None, **fields):
+    """
+    "Generate once, personalize locally": makes variant_count drafts with a name slot, then gives each
+    target a deterministic draft with their name filled in. Costs variant_count Gemini calls in total.
+    Yields (index, preview) in recipient order, like generate_previews.
+    """
+    with ThreadPoolExecutor(max_workers=IMAGE_CONCURRENCY) as image_pool:
+        image_future = image_pool.submit(generate_image, image_description)
+        drafts = generate_variants(
+            template, variant_count, max_workers=GEMINI_CONCURRENCY, campaign_id=campaign_id, **fields
+        )
+        if not drafts:
+            raise RuntimeError("No draft variant passed placeholder validation.")
+        drafts = [split_subject_body(draft) for draft in drafts]
+        img_path, fallback_description = image_future.result()
+
+    for idx, entry in enumerate(email_targets):
+        subject, body = drafts[assign_variant(entry["Emails"], len(drafts))]
+        yield idx, {
+            "recipient_name": entry["Names"],
+            "recipient_email": entry["Emails"],
+            "subject": personalize(subject, entry["Names"]),
+            "body": personalize(body, entry["Names"]),
+            "img_path": img_path,
+            "fallback_description": fallback_description,
+            "error": None
+        }
+
+
+def estimate_generation(sample_prompt, email_count, batch_size=GEMINI_BATCH_SIZE):
+    """
+    Pre-run token, cost and time estimate for generating email_count emails from prompts like
+    sample_prompt, batch_size to a request (see token_usage.estimate for the returned fields).
+    Variant mode is email_count=variant_count with batch_size=1.
+    """
+    batch_size = max(1, min(batch_size, email_count))
+    calls = math.ceil(email_count / batch_size)
+    # The system instruction is sent with every request, the batch preamble with every batched one
+    per_call = EMAIL_SYSTEM_INSTRUCTION + (BATCH_INSTRUCTION if batch_size > 1 else "")
+    prompt_tokens = calls * token_usage.estimate_tokens(per_call) + email_count * token_usage.estimate_tokens(sample_prompt)
+    return token_usage.estimate(
+        calls, prompt_tokens, email_count, concurrency=GEMINI_CONCURRENCY, rate_per_sec=get_limiter("gemini").max_rate
+    )
@@ -1,10 +1,29 @@
 import os
+import shutil
 import requests
 from dotenv import load_dotenv
 import random
+import hashlib
+import threading
+from contextlib import contextmanager
+
+from helper.image_optimizer import IMAGE_OPTIMIZE, optimize_image, optimized_filename, sniff_extension
+from helper.rate_limiter import rate_limited_call
+from helper import metrics
 
 load_dotenv()
 HF_TOKEN = os.getenv("HUGGINGFACE_API_KEY")
+IMAGE_MODEL = "black-forest-labs/FLUX.1-dev"
+
+# Content-addressed image store: one file per (model, prompt), evicted least-recently-used first
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", "generated_images")
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(500 * 1024 * 1024)))
+# Images attached to scheduled campaigns are pinned here (one subdirectory per campaign), out of eviction's reach
+PINNED_IMAGE_DIR = os.path.join(IMAGE_CACHE_DIR, "campaigns")
+
+_cache_lock = threading.Lock()
+# key -> [lock, holders]; an entry only lives while some thread holds or waits for it
+_key_locks = {}
 
 # Fallback images array
 FALLBACK_IMAGES = [
@@ -98,28 +117,169 @@ FALLBACK_IMAGES = [
 # Uncomment the code below to use this method instead
 
 # """
-from huggingface_hub import InferenceClient
+_image_client = None
+
+def get_image_client():
+    # huggingface_hub is only imported once an image is actually requested
+    global _image_client
+    with _cache_lock:
+        if _image_client is None:
+            from huggingface_hub import InferenceClient
+            _image_client = InferenceClient(
+                api_key=HF_TOKEN,
+                provider="hf-inference"  # Explicitly use hf-inference provider
+            )
+        return _image_client
+
+def image_cache_key(prompt: str, model: str = IMAGE_MODEL) -> str:
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+@contextmanager
+def _key_lock(key):
+    with _cache_lock:
+        entry = _key_locks.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _cache_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _key_locks[key]
 
-def generate_image(prompt: str, output_file="generated_image.png") -> tuple:
+def _cache_path(key, extension=".png"):
+    return os.path.join(IMAGE_CACHE_DIR, f"{key}{extension}")
+
+def _cache_lookup(path):
+    if os.path.exists(path):
+        # Touch on hit so eviction is least-recently-used rather than oldest-written
+        os.utime(path)
+        return True
+    return False
+
+def _cache_store(path, write):
+    '''
+    Write a cache entry atomically via write(tmp_path), then evict entries beyond IMAGE_CACHE_MAX_BYTES.
+    Entries are never rewritten in place, so a returned path always points at the same image.
+    '''
+    os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+    _evict_cache(keep=path)
+
+def _evict_cache(keep=None):
+    with _cache_lock:
+        entries = []
+        for name in os.listdir(IMAGE_CACHE_DIR):
+            entry_path = os.path.join(IMAGE_CACHE_DIR, name)
+            if name.endswith(".tmp") or not os.path.isfile(entry_path):
+                continue
+            stat = os.stat(entry_path)
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if total <= IMAGE_CACHE_MAX_BYTES:
+                break
+            if entry_path == keep:
+                continue
+            try:
+                os.remove(entry_path)
+                total -= size
+            except OSError:
+                pass
+
+def _optimized(path):
+    """
+    Returns the mail-ready derivative of a cached image, producing it on first use.
+    Falls back to the original if optimization is disabled or fails.
+    """
+    if not IMAGE_OPTIMIZE:
+        return path
+    try:
+        optimized_path = os.path.join(IMAGE_CACHE_DIR, optimized_filename(path))
+        with _key_lock(optimized_path):
+            if not _cache_lookup(optimized_path):
+                _cache_store(optimized_path, lambda tmp_path: optimize_image(path, tmp_path))
+        return optimized_path
+    except Exception as e:
+        print(f"[Image Optimization Error]: {e}")
+        return path
+
+def _download_fallback_image(fallback_image):
+    # Fallbacks are cached under their own URL so they never shadow a real generation for the prompt
+    key = hashlib.sha256(fallback_image['url'].encode("utf-8")).hexdigest()
+    with _key_lock(key):
+        # The extension follows the downloaded bytes (Unsplash serves JPEG), so look for any of them
+        for extension in (".jpg", ".png", ".webp", ".gif"):
+            if _cache_lookup(_cache_path(key, extension)):
+                return _cache_path(key, extension)
+        fallback_response = requests.get(fallback_image['url'], timeout=10)
+        if fallback_response.status_code != 200:
+            print(f"[Image Generation Error]: Failed to download fallback image from {fallback_image['url']} with status code {fallback_response.status_code}")
+            return None
+        path = _cache_path(key, sniff_extension(fallback_response.content))
+
+        def write(tmp_path):
+            with open(tmp_path, "wb") as f:
+                f.write(fallback_response.content)
+        _cache_store(path, write)
+        return path
+
+def pin_image(image_path, campaign_id):
+    """
+    Returns a copy of image_path (a hard link where possible) owned by campaign_id, which cache
+    eviction never removes. Scheduled sends should attach this path; release_campaign_images
+    drops it once the campaign is gone.
+    """
+    if not image_path:
+        return image_path
+    campaign_dir = os.path.join(PINNED_IMAGE_DIR, campaign_id)
+    pinned_path = os.path.join(campaign_dir, os.path.basename(image_path))
+    with _key_lock(pinned_path):
+        if not os.path.exists(pinned_path):
+            os.makedirs(campaign_dir, exist_ok=True)
+            tmp_path = f"{pinned_path}.{threading.get_ident()}.tmp"
+            try:
+                os.link(image_path, tmp_path)
+            except OSError:
+                # No hard links across filesystems or on some platforms
+                shutil.copyfile(image_path, tmp_path)
+            os.replace(tmp_path, pinned_path)
+    return pinned_path
+
+def release_campaign_images(campaign_id):
+    shutil.rmtree(os.path.join(PINNED_IMAGE_DIR, campaign_id), ignore_errors=True)
+
+def generate_image(prompt: str, model: str = IMAGE_MODEL) -> tuple:
     '''
     Generate an image using Hugging Face's InferenceClient.
     This is the recommended method for the new Inference Providers API.
+    Images are stored under IMAGE_CACHE_DIR keyed by a hash of (model, prompt), so repeated
+    descriptions are served from disk and each returned path always refers to the same image.
+    The returned path is the downscaled, re-encoded copy produced by helper.image_optimizer.
     '''
+    path = _cache_path(image_cache_key(prompt, model))
     try:
-        client = InferenceClient(
-            api_key=HF_TOKEN,
-            provider="hf-inference"  # Explicitly use hf-inference provider
-        )
-        
-        # Generate image using text_to_image method
-        image = client.text_to_image(
-            prompt=prompt,
-            model="black-forest-labs/FLUX.1-dev"
-        )
-        
-        # Save the PIL Image object to file
-        image.save(output_file)
-        return output_file, None
+        with _key_lock(path):
+            if _cache_lookup(path):
+                return _optimized(path), None
+
+            client = get_image_client()
+
+            # Generate image using text_to_image method
+            with metrics.timed("image_generation", provider="huggingface"):
+                image = rate_limited_call(
+                    "huggingface",
+                    client.text_to_image,
+                    prompt=prompt,
+                    model=model
+                )
+            
+            # Save the PIL Image object into the cache
+            _cache_store(path, lambda tmp_path: image.save(tmp_path, format="PNG"))
+            return _optimized(path), None
         
     except Exception as e:
         error_msg = str(e)
@@ -130,13 +290,9 @@ def generate_image(prompt: str, output_file="generated_image.png") -> tuple:
             for fallback_image in shuffled_images:
                 try:
                     print(f"[Image Generation Error]: {error_msg}. Attempting to download fallback image: {fallback_image['description']}")
-                    fallback_response = requests.get(fallback_image['url'], timeout=10)
-                    if fallback_response.status_code == 200:
-                        with open(output_file, "wb") as f:
-                            f.write(fallback_response.content)
-                        return output_file, fallback_image['description']
-                    else:
-                        print(f"[Image Generation Error]: Failed to download fallback image from {fallback_image['url']} with status code {fallback_response.status_code}")
+                    fallback_path = _download_fallback_image(fallback_image)
+                    if fallback_path:
+                        return _optimized(fallback_path), fallback_image['description']
                 except Exception as download_error:
                     print(f"[Image Generation Error]: Failed to download fallback image from {fallback_image['url']}: {download_error}")
                     continue
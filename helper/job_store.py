@@ -0,0 +1,583 @@
+# helper/job_store.py
+
+import os
+import json
+import uuid
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# SQLite file holding campaign content and per-email job rows; shared with APScheduler's job store
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "scheduler.db")
+
+# Per-campaign counter column each job status is tallied under
+STATUS_COUNTERS = {
+    "scheduled": "scheduled",
+    "sending": "sending",
+    "sent ✅": "sent",
+    "failed ❌": "failed",
+}
+COUNTER_COLUMNS = ("scheduled", "sending", "sent", "failed")
+
+JOB_COLUMNS = "job_id, campaign_id, content_id, send_time, recipient, status, attempts, last_error"
+
+# How long a claimed send belongs to its worker; after that another worker may take it over
+SEND_LEASE_SECONDS = int(os.getenv("SEND_LEASE_SECONDS", "300"))
+
+_lock = threading.Lock()
+_conn = None
+
+
+def _ensure_column(conn, table, column, declaration):
+    # Upgrades stores created by older versions in place
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+        return True
+    return False
+
+
+def _connection():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(JOB_STORE_PATH, check_same_thread=False, timeout=30)
+        # WAL relies on shared memory, so every process using the store must run on the same host
+        _conn.execute("PRAGMA journal_mode=WAL")
+        # Message content is stored once; every job for it only references content_id
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS contents ("
+            "content_id TEXT PRIMARY KEY, campaign_id TEXT, send_func TEXT, bulk_send_func TEXT, "
+            "payload TEXT, created_at REAL)"
+        )
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "job_id TEXT PRIMARY KEY, campaign_id TEXT, content_id TEXT, send_time REAL, "
+            "recipient TEXT, status TEXT, attempts INTEGER DEFAULT 0, last_error TEXT, "
+            "lease_owner TEXT, lease_expires REAL)"
+        )
+        # Status registry: running counts per campaign, kept in step with jobs inside the same transaction
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS campaigns ("
+            "campaign_id TEXT PRIMARY KEY, scheduled INTEGER DEFAULT 0, sending INTEGER DEFAULT 0, "
+            "sent INTEGER DEFAULT 0, failed INTEGER DEFAULT 0, created_at REAL, updated_at REAL, "
+            "started_at REAL, last_send_at REAL, sealed_at REAL)"
+        )
+        # Failed sends that exhausted their retries, with a copy of their content so they outlive the campaign
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS dead_letters ("
+            "dead_letter_id INTEGER PRIMARY KEY AUTOINCREMENT, job_id TEXT, campaign_id TEXT, recipient TEXT, "
+            "send_func TEXT, bulk_send_func TEXT, payload TEXT, attempts INTEGER, last_error TEXT, failed_at REAL)"
+        )
+        # Gemini token usage per campaign; kept after the campaign is deleted, like dead letters
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS token_usage ("
+            "campaign_id TEXT PRIMARY KEY, calls INTEGER DEFAULT 0, emails INTEGER DEFAULT 0, "
+            "prompt_tokens INTEGER DEFAULT 0, response_tokens INTEGER DEFAULT 0, updated_at REAL)"
+        )
+        _ensure_column(_conn, "contents", "bulk_send_func", "TEXT")
+        _ensure_column(_conn, "jobs", "attempts", "INTEGER DEFAULT 0")
+        _ensure_column(_conn, "jobs", "last_error", "TEXT")
+        _ensure_column(_conn, "jobs", "lease_owner", "TEXT")
+        _ensure_column(_conn, "jobs", "lease_expires", "REAL")
+        # Older versions marked sends 'sending' without a lease; expire those so they are retaken once.
+        # Current code always leases, so only rows an old version left behind match.
+        _conn.execute("UPDATE jobs SET lease_expires = 0 WHERE status = 'sending' AND lease_expires IS NULL")
+        # When the first send finished and the latest scheduled send time, for rate and ETA on the dashboard
+        _ensure_column(_conn, "campaigns", "started_at", "REAL")
+        _ensure_column(_conn, "campaigns", "last_send_at", "REAL")
+        # Set once every send of the campaign has been scheduled; only sealed campaigns are cleaned up
+        if _ensure_column(_conn, "campaigns", "sealed_at", "REAL"):
+            # Older versions cleaned up any finished campaign, so their campaigns count as sealed
+            _conn.execute("UPDATE campaigns SET sealed_at = updated_at")
+        _conn.execute("CREATE INDEX IF NOT EXISTS jobs_campaign_id ON jobs (campaign_id)")
+        _conn.execute("CREATE INDEX IF NOT EXISTS contents_campaign_id ON contents (campaign_id)")
+        _conn.execute("CREATE INDEX IF NOT EXISTS dead_letters_campaign_id ON dead_letters (campaign_id)")
+        # Time-ordered index the dispatcher drains due sends from
+        _conn.execute("CREATE INDEX IF NOT EXISTS jobs_status_send_time ON jobs (status, send_time)")
+        _conn.commit()
+        _backfill_counters(_conn)
+    return _conn
+
+
+def _backfill_counters(conn):
+    # Stores written before the registry existed have jobs but no counters
+    if conn.execute("SELECT COUNT(*) FROM campaigns").fetchone()[0]:
+        return
+    rows = conn.execute("SELECT campaign_id, status, COUNT(*) FROM jobs GROUP BY campaign_id, status").fetchall()
+    now = time.time()
+    for campaign_id, status, count in rows:
+        _adjust_counter(conn, campaign_id, status, count, now)
+    conn.commit()
+
+
+def close_connection():
+    """
+    Closes this process's connection; the next call opens a fresh one. Call before forking, since a
+    SQLite connection must never be shared between processes.
+    """
+    global _conn
+    with _lock:
+        if _conn is not None:
+            _conn.close()
+            _conn = None
+
+
+@contextmanager
+def _transaction():
+    # The thread lock serializes this process's workers; BEGIN IMMEDIATE serializes other processes
+    with _lock:
+        conn = _connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+def _adjust_counter(conn, campaign_id, status, delta, now):
+    column = STATUS_COUNTERS.get(status)
+    if column is None or not delta:
+        return
+    started = ", started_at = COALESCE(started_at, excluded.updated_at)" if column in ("sent", "failed") else ""
+    conn.execute(
+        f"INSERT INTO campaigns (campaign_id, {column}, created_at, updated_at) VALUES (?, ?, ?, ?) "
+        f"ON CONFLICT(campaign_id) DO UPDATE SET {column} = {column} + excluded.{column}, "
+        f"updated_at = excluded.updated_at{started}",
+        (campaign_id, delta, now, now)
+    )
+
+
+def save_content(campaign_id, send_func_ref, payload, bulk_send_func_ref=None):
+    """
+    Stores one message's send function references and kwargs; returns its content_id.
+    """
+    content_id = str(uuid.uuid4())
+    with _transaction() as conn:
+        conn.execute(
+            "INSERT INTO contents (content_id, campaign_id, send_func, bulk_send_func, payload, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (content_id, campaign_id, send_func_ref, bulk_send_func_ref, json.dumps(payload), time.time())
+        )
+    return content_id
+
+
+def get_content(content_id):
+    """
+    Returns (send_func_ref, payload dict) for a content_id, or (None, None) if it no longer exists.
+    """
+    with _lock:
+        row = _connection().execute(
+            "SELECT send_func, payload FROM contents WHERE content_id = ?", (content_id,)
+        ).fetchone()
+    if row is None:
+        return None, None
+    return row[0], json.loads(row[1])
+
+
+def get_contents(content_ids):
+    """
+    Returns {content_id: (send_func_ref, bulk_send_func_ref, payload dict)} for the given ids.
+    """
+    content_ids = list(set(content_ids))
+    if not content_ids:
+        return {}
+    placeholders = ", ".join("?" for _ in content_ids)
+    with _lock:
+        rows = _connection().execute(
+            f"SELECT content_id, send_func, bulk_send_func, payload FROM contents WHERE content_id IN ({placeholders})",
+            content_ids
+        ).fetchall()
+    return {row[0]: (row[1], row[2], json.loads(row[3])) for row in rows}
+
+
+def add_jobs(jobs):
+    """
+    Inserts job rows given as dicts with job_id, campaign_id, content_id, send_time (datetime) and recipient.
+    Job ids that already exist are left untouched.
+    """
+    now = time.time()
+    with _transaction() as conn:
+        added = {}
+        last_send = {}
+        for job in jobs:
+            send_time = job["send_time"].timestamp()
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (job_id, campaign_id, content_id, send_time, recipient, status) "
+                "VALUES (?, ?, ?, ?, ?, 'scheduled')",
+                (job["job_id"], job["campaign_id"], job["content_id"], send_time, job["recipient"])
+            )
+            added[job["campaign_id"]] = added.get(job["campaign_id"], 0) + cursor.rowcount
+            last_send[job["campaign_id"]] = max(last_send.get(job["campaign_id"], send_time), send_time)
+        for campaign_id, count in added.items():
+            _adjust_counter(conn, campaign_id, "scheduled", count, now)
+            conn.execute(
+                "UPDATE campaigns SET last_send_at = MAX(COALESCE(last_send_at, 0), ?) WHERE campaign_id = ?",
+                (last_send[campaign_id], campaign_id)
+            )
+
+
+def get_job(job_id):
+    with _lock:
+        row = _connection().execute(
+            f"SELECT {JOB_COLUMNS} FROM jobs WHERE job_id = ?",
+            (job_id,)
+        ).fetchone()
+    return _job_from_row(row) if row else None
+
+
+def _job_from_row(row):
+    return {
+        "job_id": row[0],
+        "campaign_id": row[1],
+        "content_id": row[2],
+        "send_time": datetime.fromtimestamp(row[3]),
+        "recipient": row[4],
+        "status": row[5],
+        "attempts": row[6],
+        "last_error": row[7]
+    }
+
+
+def _move_counts(conn, rows, old_status, new_status, now):
+    moved = {}
+    for row in rows:
+        moved[row[1]] = moved.get(row[1], 0) + 1
+    for campaign_id, count in moved.items():
+        _adjust_counter(conn, campaign_id, old_status, -count, now)
+        _adjust_counter(conn, campaign_id, new_status, count, now)
+
+
+def _reclaim_expired_leases(conn, now):
+    # Sends whose worker died go back to the queue; a row without a lease is never touched.
+    # Delivery is at-least-once: a worker that stalled past its lease may still have sent the email.
+    rows = conn.execute(
+        "SELECT job_id, campaign_id FROM jobs "
+        "WHERE status = 'sending' AND lease_expires IS NOT NULL AND lease_expires < ?",
+        (now,)
+    ).fetchall()
+    conn.executemany(
+        "UPDATE jobs SET status = 'scheduled', lease_owner = NULL, lease_expires = NULL WHERE job_id = ?",
+        [(row[0],) for row in rows]
+    )
+    _move_counts(conn, rows, "sending", "scheduled", now)
+    return len(rows)
+
+
+def get_lease_owners(now=None):
+    """
+    Returns the owners ("host:pid") holding unexpired send leases.
+    """
+    now = now or time.time()
+    with _lock:
+        rows = _connection().execute(
+            "SELECT DISTINCT lease_owner FROM jobs WHERE status = 'sending' AND lease_expires > ?", (now,)
+        ).fetchall()
+    return [row[0] for row in rows if row[0]]
+
+
+def claim_due_jobs(now, limit, owner=None, lease_seconds=SEND_LEASE_SECONDS):
+    """
+    Atomically leases up to limit jobs due at or before now to owner for lease_seconds, moving them
+    from 'scheduled' to 'sending' earliest first, and returns them. Expired leases are reclaimed first,
+    so jobs left in 'sending' by a crashed worker are picked up again.
+    BEGIN IMMEDIATE makes the claim safe across any number of worker processes sharing the file.
+    """
+    with _transaction() as conn:
+        _reclaim_expired_leases(conn, now.timestamp())
+        rows = conn.execute(
+            f"SELECT {JOB_COLUMNS} FROM jobs "
+            "WHERE status = 'scheduled' AND send_time <= ? ORDER BY send_time LIMIT ?",
+            (now.timestamp(), limit)
+        ).fetchall()
+        conn.executemany(
+            "UPDATE jobs SET status = 'sending', lease_owner = ?, lease_expires = ? WHERE job_id = ?",
+            [(owner, now.timestamp() + lease_seconds, row[0]) for row in rows]
+        )
+        _move_counts(conn, rows, "scheduled", "sending", now.timestamp())
+    jobs = [_job_from_row(row) for row in rows]
+    for job in jobs:
+        job["status"] = "sending"
+    return jobs
+
+
+def claim_job(job_id, owner=None, now=None, lease_seconds=SEND_LEASE_SECONDS):
+    """
+    Leases one job to owner, like claim_due_jobs, whatever its send time. Returns the job, or None
+    if it is gone or not 'scheduled' (already sending or sent elsewhere, or finished).
+    """
+    now = now or time.time()
+    with _transaction() as conn:
+        row = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        claimed = conn.execute(
+            "UPDATE jobs SET status = 'sending', lease_owner = ?, lease_expires = ? "
+            "WHERE job_id = ? AND status = 'scheduled'",
+            (owner, now + lease_seconds, job_id)
+        ).rowcount
+        if not claimed:
+            return None
+        _move_counts(conn, [row], "scheduled", "sending", now)
+    job = _job_from_row(row)
+    job["status"] = "sending"
+    return job
+
+
+def set_job_status(job_id, status):
+    set_job_statuses([(job_id, status)])
+
+
+def set_job_statuses(updates):
+    """
+    Applies (job_id, status) updates in one transaction, moving each job between its campaign's counters.
+    """
+    now = time.time()
+    with _transaction() as conn:
+        for job_id, status in updates:
+            row = conn.execute("SELECT campaign_id, status FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None or row[1] == status:
+                continue
+            conn.execute("UPDATE jobs SET status = ? WHERE job_id = ?", (status, job_id))
+            _adjust_counter(conn, row[0], row[1], -1, now)
+            _adjust_counter(conn, row[0], status, 1, now)
+
+
+def record_send_results(results, now=None, owner=None):
+    """
+    Applies the outcome of a round of sends in one transaction. results holds dicts with job_id and
+    outcome: "sent"; "retry" (plus next_send_time and error) to re-queue the job for later; or
+    "dead" (plus error) to mark it failed and copy it, with its content, to the dead-letter list.
+    Results from owner are ignored for jobs whose lease has since passed to another worker.
+    """
+    now = now or time.time()
+    with _transaction() as conn:
+        for result in results:
+            row = conn.execute(
+                "SELECT j.campaign_id, j.status, j.recipient, j.attempts, c.send_func, c.bulk_send_func, c.payload, "
+                "j.lease_owner FROM jobs j LEFT JOIN contents c ON c.content_id = j.content_id WHERE j.job_id = ?",
+                (result["job_id"],)
+            ).fetchone()
+            if row is None:
+                # Cancelled while in flight
+                continue
+            campaign_id, old_status, recipient, attempts, send_func, bulk_send_func, payload, lease_owner = row
+            if owner and lease_owner and lease_owner != owner:
+                continue
+            conn.execute("UPDATE jobs SET lease_owner = NULL, lease_expires = NULL WHERE job_id = ?",
+                         (result["job_id"],))
+            attempts = (attempts or 0) + 1
+            if result["outcome"] == "sent":
+                new_status = "sent ✅"
+                conn.execute("UPDATE jobs SET status = ?, attempts = ? WHERE job_id = ?",
+                             (new_status, attempts, result["job_id"]))
+            elif result["outcome"] == "retry":
+                new_status = "scheduled"
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = ?, last_error = ?, send_time = ? WHERE job_id = ?",
+                    (new_status, attempts, result.get("error"), result["next_send_time"].timestamp(), result["job_id"])
+                )
+            else:
+                new_status = "failed ❌"
+                conn.execute("UPDATE jobs SET status = ?, attempts = ?, last_error = ? WHERE job_id = ?",
+                             (new_status, attempts, result.get("error"), result["job_id"]))
+                # Recorded even when the content is gone, so the failure shows up instead of vanishing
+                conn.execute(
+                    "INSERT INTO dead_letters (job_id, campaign_id, recipient, send_func, bulk_send_func, "
+                    "payload, attempts, last_error, failed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (result["job_id"], campaign_id, recipient, send_func, bulk_send_func, payload,
+                     attempts, result.get("error"), now)
+                )
+            if new_status != old_status:
+                _adjust_counter(conn, campaign_id, old_status, -1, now)
+                _adjust_counter(conn, campaign_id, new_status, 1, now)
+
+
+def get_dead_letters(campaign_id=None):
+    """
+    Returns dead-lettered sends (newest first) as dicts, optionally for one campaign.
+    """
+    query = ("SELECT dead_letter_id, job_id, campaign_id, recipient, attempts, last_error, failed_at "
+             "FROM dead_letters")
+    params = ()
+    if campaign_id is not None:
+        query += " WHERE campaign_id = ?"
+        params = (campaign_id,)
+    with _lock:
+        rows = _connection().execute(query + " ORDER BY failed_at DESC", params).fetchall()
+    return [
+        {
+            "dead_letter_id": row[0],
+            "job_id": row[1],
+            "campaign_id": row[2],
+            "recipient": row[3],
+            "attempts": row[4],
+            "last_error": row[5],
+            "failed_at": datetime.fromtimestamp(row[6])
+        }
+        for row in rows
+    ]
+
+
+def requeue_dead_letters(dead_letter_ids=None, send_time=None):
+    """
+    Moves dead letters (all of them if dead_letter_ids is None) back into the jobs table as fresh
+    'scheduled' jobs due at send_time (default now). Returns the re-created jobs. Dead letters whose
+    content was lost cannot be re-sent and stay on the list.
+    """
+    send_time = send_time or datetime.now()
+    now = time.time()
+    query = ("SELECT dead_letter_id, job_id, campaign_id, recipient, send_func, bulk_send_func, payload "
+             "FROM dead_letters WHERE payload IS NOT NULL")
+    params = ()
+    if dead_letter_ids is not None:
+        dead_letter_ids = list(dead_letter_ids)
+        if not dead_letter_ids:
+            return []
+        query += f" AND dead_letter_id IN ({', '.join('?' for _ in dead_letter_ids)})"
+        params = dead_letter_ids
+    jobs = []
+    with _transaction() as conn:
+        for dead_letter_id, job_id, campaign_id, recipient, send_func, bulk_send_func, payload in \
+                conn.execute(query, params).fetchall():
+            content_id = str(uuid.uuid4())
+            conn.execute(
+                "INSERT INTO contents (content_id, campaign_id, send_func, bulk_send_func, payload, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (content_id, campaign_id, send_func, bulk_send_func, payload, now)
+            )
+            job = {
+                "job_id": f"{job_id}_resend_{dead_letter_id}",
+                "campaign_id": campaign_id,
+                "content_id": content_id,
+                "send_time": send_time,
+                "recipient": recipient
+            }
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (job_id, campaign_id, content_id, send_time, recipient, status, attempts) "
+                "VALUES (?, ?, ?, ?, ?, 'scheduled', 0)",
+                (job["job_id"], campaign_id, content_id, send_time.timestamp(), recipient)
+            )
+            _adjust_counter(conn, campaign_id, "scheduled", 1, now)
+            # The re-sends are all the campaign gets, so it may be cleaned up again once they finish
+            conn.execute("UPDATE campaigns SET sealed_at = COALESCE(sealed_at, ?) WHERE campaign_id = ?",
+                         (now, campaign_id))
+            conn.execute("DELETE FROM dead_letters WHERE dead_letter_id = ?", (dead_letter_id,))
+            jobs.append(job)
+    return jobs
+
+
+def get_all_jobs():
+    """
+    Returns {job_id: {"status", "send_time", "recipient", "campaign_id"}} for every stored job,
+    ordered by send time.
+    """
+    with _lock:
+        rows = _connection().execute(
+            f"SELECT {JOB_COLUMNS} FROM jobs ORDER BY send_time"
+        ).fetchall()
+    jobs = {}
+    for row in rows:
+        job = _job_from_row(row)
+        jobs[job.pop("job_id")] = {key: job[key] for key in ("status", "send_time", "recipient", "campaign_id")}
+    return jobs
+
+
+def get_campaign_job_ids(campaign_id):
+    with _lock:
+        rows = _connection().execute("SELECT job_id FROM jobs WHERE campaign_id = ?", (campaign_id,)).fetchall()
+    return [row[0] for row in rows]
+
+
+def get_campaign_counts(campaign_id):
+    """
+    Returns {"scheduled", "sending", "sent", "failed"} counts for a campaign, or None if it is unknown.
+    """
+    with _lock:
+        row = _connection().execute(
+            f"SELECT {', '.join(COUNTER_COLUMNS)} FROM campaigns WHERE campaign_id = ?", (campaign_id,)
+        ).fetchone()
+    return dict(zip(COUNTER_COLUMNS, row)) if row else None
+
+
+def get_campaign_summaries():
+    """
+    Returns {campaign_id: counts} for every campaign, read from the counters alone (no job scan).
+    Besides the status counts each entry has created_at, started_at (first finished send) and
+    last_send_at (latest scheduled send time) as epoch seconds, or None.
+    """
+    columns = COUNTER_COLUMNS + ("created_at", "started_at", "last_send_at")
+    with _lock:
+        rows = _connection().execute(
+            f"SELECT campaign_id, {', '.join(columns)} FROM campaigns ORDER BY created_at"
+        ).fetchall()
+    return {row[0]: dict(zip(columns, row[1:])) for row in rows}
+
+
+def add_token_usage(campaign_id, prompt_tokens, response_tokens, emails=1, calls=1):
+    with _transaction() as conn:
+        conn.execute(
+            "INSERT INTO token_usage (campaign_id, calls, emails, prompt_tokens, response_tokens, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(campaign_id) DO UPDATE SET "
+            "calls = calls + excluded.calls, emails = emails + excluded.emails, "
+            "prompt_tokens = prompt_tokens + excluded.prompt_tokens, "
+            "response_tokens = response_tokens + excluded.response_tokens, updated_at = excluded.updated_at",
+            (campaign_id, calls, emails, prompt_tokens, response_tokens, time.time())
+        )
+
+
+def get_token_usage(campaign_id=None):
+    """
+    Returns {campaign_id: {"calls", "emails", "prompt_tokens", "response_tokens"}} summed per campaign,
+    for one campaign or all of them.
+    """
+    columns = ("calls", "emails", "prompt_tokens", "response_tokens")
+    query = f"SELECT campaign_id, {', '.join(columns)} FROM token_usage"
+    with _lock:
+        if campaign_id is None:
+            rows = _connection().execute(query).fetchall()
+        else:
+            rows = _connection().execute(query + " WHERE campaign_id = ?", (campaign_id,)).fetchall()
+    return {row[0]: dict(zip(columns, row[1:])) for row in rows}
+
+
+def seal_campaign(campaign_id):
+    """
+    Marks a campaign as fully scheduled, so it may be cleaned up once its last send finishes.
+    """
+    now = time.time()
+    with _transaction() as conn:
+        conn.execute(
+            "INSERT INTO campaigns (campaign_id, created_at, updated_at, sealed_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(campaign_id) DO UPDATE SET sealed_at = excluded.sealed_at",
+            (campaign_id, now, now, now)
+        )
+
+
+def campaign_finished(campaign_id):
+    """
+    True once a sealed campaign has nothing scheduled or sending. Campaigns still being scheduled
+    (one schedule_batch_emails call per recipient) can pass through zero counts and are never finished.
+    """
+    with _lock:
+        row = _connection().execute(
+            "SELECT scheduled, sending, sealed_at FROM campaigns WHERE campaign_id = ?", (campaign_id,)
+        ).fetchone()
+    return row is not None and row[2] is not None and row[0] == 0 and row[1] == 0
+
+
+def delete_campaign(campaign_id):
+    """
+    Removes a campaign's job rows, stored content and counters. Returns the number of job rows removed.
+    """
+    with _transaction() as conn:
+        removed = conn.execute("DELETE FROM jobs WHERE campaign_id = ?", (campaign_id,)).rowcount
+        conn.execute("DELETE FROM contents WHERE campaign_id = ?", (campaign_id,))
+        conn.execute("DELETE FROM campaigns WHERE campaign_id = ?", (campaign_id,))
+    return removed
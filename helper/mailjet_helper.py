@@ -1,17 +1,93 @@
 import os
+import json
+import threading
+from collections import OrderedDict
 from dotenv import load_dotenv
-from mailjet_rest import Client
+import requests
+from requests.adapters import HTTPAdapter
 import base64
 
+from helper.image_optimizer import content_type_for
+from helper.rate_limiter import get_limiter, parse_retry_after
+from helper import metrics
+
 load_dotenv()
 api_key = os.getenv('MAILJET_API_KEY')
 api_secret = os.getenv('MAILJET_SECRET_KEY')
 sender_email = os.getenv('SENDER_MAIL')
 
-def send_test_email(recipient, subject, body, image_path=None,
-                    sender_name="", sender_title="", sender_contact=""):
-    mailjet = Client(auth=(api_key, api_secret), version='v3.1')
+# Mailjet's v3.1 Send API accepts at most 50 messages per request
+MAILJET_MAX_BATCH = 50
+MAILJET_TIMEOUT = int(os.getenv('MAILJET_TIMEOUT', '10'))
+MAILJET_POOL_SIZE = int(os.getenv('MAILJET_POOL_SIZE', '10'))
+# Send the image only as an inline (cid:) attachment instead of both inline and as a regular attachment
+MAILJET_INLINE_ONLY = os.getenv('MAILJET_INLINE_ONLY', '').lower() in ('1', 'true', 'yes')
+MAILJET_ATTACHMENT_CACHE_SIZE = int(os.getenv('MAILJET_ATTACHMENT_CACHE_SIZE', '32'))
+
+_client = None
+_session = None
+_client_lock = threading.Lock()
+
+_attachment_cache = OrderedDict()
+_attachment_lock = threading.Lock()
+
+def get_mailjet_client():
+    """
+    Returns the long-lived Mailjet client and a pooled requests.Session used to post to it.
+    mailjet_rest opens a new connection per call, so sends go through the shared session
+    (keep-alive, no repeated TLS handshakes) using the client's URL, headers and auth.
+    """
+    global _client, _session
+    with _client_lock:
+        if _client is None:
+            # Imported on first send rather than at app startup
+            from mailjet_rest import Client
+            _client = Client(auth=(api_key, api_secret), version='v3.1')
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MAILJET_POOL_SIZE)
+            _session.mount("https://", adapter)
+        return _client, _session
 
+def _post_messages(msgs):
+    client, session = get_mailjet_client()
+    url, headers = client.config["send"]
+    limiter = get_limiter("mailjet")
+    limiter.acquire()
+    with metrics.timed("mailjet_send", provider="mailjet"):
+        result = session.post(url, data=json.dumps({'Messages': msgs}), headers=headers,
+                              auth=client.auth, timeout=MAILJET_TIMEOUT)
+    metrics.increment("messages_posted", len(msgs), provider="mailjet")
+    if result.status_code != 200:
+        metrics.record_error("mailjet", f"http_{result.status_code}")
+    # A 429 slows every sender down and pauses them for Retry-After; the caller sees the 429 status
+    if result.status_code == 429:
+        limiter.on_rate_limited(parse_retry_after(result.headers.get("Retry-After")))
+        metrics.increment("rate_limited", provider="mailjet")
+    else:
+        limiter.on_success()
+    return result
+
+def encode_attachment(image_path):
+    """
+    Returns (filename, content type, base64 content) for image_path, memoized on path, mtime and size
+    so a campaign reuses one encoding instead of re-reading the file for every email.
+    """
+    stat = os.stat(image_path)
+    key = (os.path.abspath(image_path), stat.st_mtime_ns, stat.st_size)
+    with _attachment_lock:
+        if key in _attachment_cache:
+            _attachment_cache.move_to_end(key)
+            return _attachment_cache[key]
+    with metrics.timed("attachment_encode"), open(image_path, "rb") as f:
+        encoded = (os.path.basename(image_path), content_type_for(image_path), base64.b64encode(f.read()).decode())
+    with _attachment_lock:
+        _attachment_cache[key] = encoded
+        while len(_attachment_cache) > MAILJET_ATTACHMENT_CACHE_SIZE:
+            _attachment_cache.popitem(last=False)
+    return encoded
+
+def build_message(recipient, subject, body, image_path=None,
+                  sender_name="", sender_title="", sender_contact="", inline_only=None):
     # Compose sender info for footer
     sender_footer = f"<br><br>Best regards,<br>{sender_name}<br>{sender_title}<br>{sender_contact}"
 
@@ -32,26 +108,65 @@ def send_test_email(recipient, subject, body, image_path=None,
     # Handle image inline/attachment
     if image_path:
         try:
-            with open(image_path, "rb") as f:
-                image_bytes = f.read()
-            encoded_image = base64.b64encode(image_bytes).decode()
+            filename, content_type, encoded_image = encode_attachment(image_path)
             msg["HTMLPart"] += f'<br><img src="cid:embedded_image" alt="Embedded Image" style="max-width:100%;height:auto;">'
             msg["InlineAttachments"] = [{
-                "ContentType": "image/png",
-                "Filename": os.path.basename(image_path),
+                "ContentType": content_type,
+                "Filename": filename,
                 "ContentID": "embedded_image",
                 "Base64Content": encoded_image
             }]
-            msg["Attachments"] = [{
-                "ContentType": "image/png",
-                "Filename": os.path.basename(image_path),
-                "Base64Content": encoded_image
-            }]
+            if not (MAILJET_INLINE_ONLY if inline_only is None else inline_only):
+                msg["Attachments"] = [{
+                    "ContentType": content_type,
+                    "Filename": filename,
+                    "Base64Content": encoded_image
+                }]
         except Exception as e:
             print(f"Error attaching image: {e}")
 
+    return msg
+
+def send_test_email(recipient, subject, body, image_path=None,
+                    sender_name="", sender_title="", sender_contact="", inline_only=None):
+    msg = build_message(recipient, subject, body, image_path=image_path,
+                        sender_name=sender_name, sender_title=sender_title, sender_contact=sender_contact,
+                        inline_only=inline_only)
+
     try:
-        result = mailjet.send.create({'Messages': [msg]})
+        result = _post_messages([msg])
         return result.status_code, result.json()
     except Exception as e:
         return 500, {"error": f"Failed to send email: {str(e)}"}
+
+def send_bulk_emails(messages, batch_size=MAILJET_MAX_BATCH):
+    """
+    Sends many emails through the v3.1 Send API, packing up to batch_size messages per request.
+    messages is a list of dicts with the same keys as send_test_email's arguments.
+    Returns a list of (status, response) aligned with messages, like send_test_email's return value.
+    """
+    batch_size = max(1, min(batch_size, MAILJET_MAX_BATCH))
+    statuses = []
+
+    for start in range(0, len(messages), batch_size):
+        batch = messages[start:start + batch_size]
+        msgs = [build_message(**message) for message in batch]
+        try:
+            result = _post_messages(msgs)
+            payload = result.json()
+        except Exception as e:
+            statuses.extend((500, {"error": f"Failed to send email: {str(e)}"}) for _ in batch)
+            continue
+
+        # Each entry in the response's Messages list reports on the message at the same position
+        results = payload.get("Messages") if isinstance(payload, dict) else None
+        if not isinstance(results, list) or len(results) != len(batch):
+            statuses.extend((result.status_code if result.status_code != 200 else 500, payload) for _ in batch)
+            continue
+        for message_result in results:
+            if message_result.get("Status") == "success":
+                statuses.append((200, message_result))
+            else:
+                statuses.append((result.status_code if result.status_code != 200 else 400, message_result))
+
+    return statuses
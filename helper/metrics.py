@@ -0,0 +1,208 @@
+# helper/metrics.py
+
+import os
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Serve Prometheus text on http://<host>:METRICS_PORT/metrics when set (see start_metrics_server)
+METRICS_PORT = os.getenv("METRICS_PORT")
+
+# Latency histogram bucket upper bounds, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 3600.0)
+
+# Pipeline stages in dashboard order
+STAGES = (
+    "prompt_build", "gemini_call", "gemini_first_token", "image_generation", "attachment_encode", "mailjet_send",
+    "scheduler_lag"
+)
+
+_lock = threading.Lock()
+_counters = {}
+_histograms = {}
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def increment(name, amount=1, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(stage, seconds, **labels):
+    """
+    Records one latency sample for stage (plus optional labels such as provider).
+    """
+    key = _key(stage, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * (len(BUCKETS) + 1), "count": 0, "sum": 0.0}
+        histogram["buckets"][bisect.bisect_left(BUCKETS, seconds)] += 1
+        histogram["count"] += 1
+        histogram["sum"] += seconds
+
+
+def record_error(provider, error_class):
+    increment("errors", provider=provider, error_class=error_class)
+
+
+@contextmanager
+def timed(stage, provider=None):
+    """
+    Times the with-block as one sample of stage. An exception escaping the block is also
+    counted under the provider (or the stage) by exception class, then re-raised.
+    """
+    labels = {"provider": provider} if provider else {}
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_error(provider or stage, type(e).__name__)
+        raise
+    finally:
+        observe(stage, time.perf_counter() - start, **labels)
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _histograms.clear()
+
+
+def snapshot():
+    """
+    Returns {"counters": [...], "histograms": [...]}. Each entry carries its name and labels;
+    histograms also have count, sum and cumulative bucket counts keyed by upper bound.
+    """
+    with _lock:
+        counters = [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in _counters.items()]
+        histograms = []
+        for (name, labels), histogram in _histograms.items():
+            cumulative, running = {}, 0
+            for bound, count in zip(BUCKETS + (float("inf"),), histogram["buckets"]):
+                running += count
+                cumulative[bound] = running
+            histograms.append({
+                "name": name, "labels": dict(labels), "count": histogram["count"],
+                "sum": histogram["sum"], "buckets": cumulative
+            })
+    return {"counters": counters, "histograms": histograms}
+
+
+def _quantile(buckets, count, q):
+    # Linear interpolation inside the bucket holding the q-th sample, as Prometheus' histogram_quantile does
+    rank = q * count
+    lower, below = 0.0, 0
+    for bound, cumulative in buckets.items():
+        if cumulative >= rank:
+            if bound == float("inf"):
+                return lower
+            in_bucket = cumulative - below
+            return lower + (bound - lower) * ((rank - below) / in_bucket if in_bucket else 0)
+        lower, below = bound, cumulative
+    return lower
+
+
+def summary():
+    """
+    Per-stage rows for the dashboard: count, mean, p50 and p95 latency in seconds (labels merged),
+    plus error counts by (provider, error class).
+    """
+    data = snapshot()
+    stages = {}
+    for histogram in data["histograms"]:
+        merged = stages.setdefault(histogram["name"], {"count": 0, "sum": 0.0, "buckets": {}})
+        merged["count"] += histogram["count"]
+        merged["sum"] += histogram["sum"]
+        for bound, cumulative in histogram["buckets"].items():
+            merged["buckets"][bound] = merged["buckets"].get(bound, 0) + cumulative
+
+    rows = []
+    for stage in sorted(stages, key=lambda name: STAGES.index(name) if name in STAGES else len(STAGES)):
+        merged = stages[stage]
+        rows.append({
+            "stage": stage,
+            "count": merged["count"],
+            "mean": merged["sum"] / merged["count"] if merged["count"] else 0.0,
+            "p50": _quantile(merged["buckets"], merged["count"], 0.5),
+            "p95": _quantile(merged["buckets"], merged["count"], 0.95),
+        })
+    errors = {
+        (counter["labels"]["provider"], counter["labels"]["error_class"]): counter["value"]
+        for counter in data["counters"] if counter["name"] == "errors"
+    }
+    return rows, errors
+
+
+def _format_labels(labels, extra=None):
+    labels = dict(labels, **(extra or {}))
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + "}"
+
+
+def render_prometheus():
+    """
+    Returns all metrics in the Prometheus text exposition format.
+    """
+    data = snapshot()
+    lines = []
+    for name in sorted({counter["name"] for counter in data["counters"]}):
+        metric = f"outreach_{name}_total"
+        lines.append(f"# TYPE {metric} counter")
+        for counter in data["counters"]:
+            if counter["name"] == name:
+                lines.append(f"{metric}{_format_labels(counter['labels'])} {counter['value']}")
+
+    if data["histograms"]:
+        lines.append("# TYPE outreach_stage_seconds histogram")
+    for histogram in data["histograms"]:
+        labels = dict(histogram["labels"], stage=histogram["name"])
+        for bound, cumulative in histogram["buckets"].items():
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"outreach_stage_seconds_bucket{_format_labels(labels, {'le': le})} {cumulative}")
+        lines.append(f"outreach_stage_seconds_sum{_format_labels(labels)} {histogram['sum']}")
+        lines.append(f"outreach_stage_seconds_count{_format_labels(labels)} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+_server = None
+
+
+def start_metrics_server(port=None):
+    """
+    Serves render_prometheus() at /metrics on port (default METRICS_PORT) from a daemon thread.
+    Does nothing if no port is configured; later calls return the running server.
+    """
+    global _server
+    port = port or METRICS_PORT
+    if not port:
+        return None
+    with _lock:
+        if _server is None:
+            from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+            class MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split("?")[0] != "/metrics":
+                        self.send_error(404)
+                        return
+                    body = render_prometheus().encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/plain; version=0.0.4")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass
+
+            _server = ThreadingHTTPServer(("", int(port)), MetricsHandler)
+            threading.Thread(target=_server.serve_forever, daemon=True, name="metrics-server").start()
+        return _server
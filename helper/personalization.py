@@ -0,0 +1,71 @@
+# helper/personalization.py
+
+import re
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from helper.gemini_helper import generate_email_with_gemini
+
+# Token Gemini is asked to leave wherever the recipient's name belongs; filled in locally per recipient
+NAME_SLOT = "{{RECIPIENT_NAME}}"
+
+VARIANT_INSTRUCTION = (
+    "\nThis is draft variant {variant} of {variant_count}; make its wording distinct from the other variants. "
+    "Do not invent a recipient name: write the exact token {name_slot} everywhere the recipient's name belongs."
+)
+
+# Bracketed/braced text, "(...)" and "___" blanks that must never reach a recipient
+PLACEHOLDER_PATTERN = re.compile(r"\[[^\]\n]*\]|\{[^}\n]*\}|\(\s*\.\.\.\s*\)|_{3,}")
+
+
+def find_placeholders(text):
+    return PLACEHOLDER_PATTERN.findall(text)
+
+
+def build_variant_prompts(template, variant_count, **fields):
+    """
+    Formats the template once per variant with the name slot in place of {recipient_name}.
+    """
+    base_prompt = template.format(recipient_name=NAME_SLOT, **fields)
+    return [
+        base_prompt + VARIANT_INSTRUCTION.format(variant=i + 1, variant_count=variant_count, name_slot=NAME_SLOT)
+        for i in range(variant_count)
+    ]
+
+
+def _generate_variant(prompt, max_attempts, campaign_id=None):
+    for attempt in range(max_attempts):
+        # Retries must bypass the response cache or they would return the same rejected draft
+        draft = generate_email_with_gemini(prompt, use_cache=(attempt == 0), campaign_id=campaign_id)
+        if not find_placeholders(draft.replace(NAME_SLOT, "")):
+            return draft
+        print(f"[Personalization Error]: Draft variant rejected for placeholder text: {find_placeholders(draft.replace(NAME_SLOT, ''))}")
+    return None
+
+
+def generate_variants(template, variant_count, max_attempts=3, max_workers=8, campaign_id=None, **fields):
+    """
+    Generates variant_count drafts containing NAME_SLOT, regenerating any draft with leftover
+    placeholder text up to max_attempts times. Returns only the drafts that passed validation.
+    """
+    prompts = build_variant_prompts(template, variant_count, **fields)
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        drafts = list(pool.map(lambda prompt: _generate_variant(prompt, max_attempts, campaign_id), prompts))
+    return [draft for draft in drafts if draft is not None]
+
+
+def assign_variant(recipient_email, variant_count):
+    # Stable across runs and processes (unlike hash()), so a recipient always gets the same draft
+    digest = hashlib.sha256(str(recipient_email).strip().lower().encode("utf-8")).hexdigest()
+    return int(digest[:8], 16) % variant_count
+
+
+def personalize(text, recipient_name):
+    """
+    Substitutes the recipient name into a draft. Raises ValueError if the draft itself has placeholder
+    text besides the name slot; the name is not checked, so "Acme (EU)" or "[Ops] Team" are fine.
+    """
+    leaked = find_placeholders(text.replace(NAME_SLOT, ""))
+    if leaked:
+        raise ValueError(f"Placeholder text left in personalized email: {leaked}")
+    return text.replace(NAME_SLOT, str(recipient_name))
@@ -0,0 +1,153 @@
+# helper/rate_limiter.py
+
+import os
+import time
+import threading
+from email.utils import parsedate_to_datetime
+from dotenv import load_dotenv
+
+from helper import metrics
+
+load_dotenv()
+
+# Requests per second each provider starts at (and recovers back up to) unless overridden by env,
+# e.g. MAILJET_RATE_PER_SEC=20 or GEMINI_BURST=10
+DEFAULT_RATES = {
+    "mailjet": 5.0,
+    "gemini": 5.0,
+    "huggingface": 1.0,
+}
+# Retries rate_limited_call makes after a 429 before giving up
+RATE_LIMIT_RETRIES = int(os.getenv("RATE_LIMIT_RETRIES", "3"))
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every caller of one provider within this process.
+    A 429 halves the rate (down to min_rate) and pauses all callers for Retry-After seconds;
+    each success afterwards adds back a small step until max_rate is reached again.
+    """
+
+    def __init__(self, max_rate, burst=None, min_rate=None):
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.min_rate = min_rate if min_rate is not None else max_rate / 32
+        self.burst = burst if burst is not None else max(1.0, max_rate)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, tokens=1):
+        """
+        Blocks until tokens are available and any Retry-After pause has passed.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.blocked_until and self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = max(self.blocked_until - now, (tokens - self.tokens) / self.rate)
+            time.sleep(max(wait, 0.001))
+
+    def on_success(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    def on_rate_limited(self, retry_after=None):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = 0.0
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+# How many processes split each provider's configured rate; see set_process_count
+_process_count = 1
+
+
+def set_process_count(count):
+    """
+    Declares that count processes (e.g. outreach_cli.py worker --processes N) send in parallel,
+    so each process's buckets get 1/count of the configured rate and burst and the total stays
+    within it. Call in each process before its first get_limiter().
+    """
+    global _process_count
+    with _limiters_lock:
+        _process_count = max(1, int(count))
+        _limiters.clear()
+
+
+def get_limiter(provider):
+    with _limiters_lock:
+        if provider not in _limiters:
+            rate = float(os.getenv(f"{provider.upper()}_RATE_PER_SEC", DEFAULT_RATES.get(provider, 5.0)))
+            burst = os.getenv(f"{provider.upper()}_BURST")
+            _limiters[provider] = RateLimiter(
+                rate / _process_count,
+                burst=max(1.0, float(burst) / _process_count) if burst else None
+            )
+        return _limiters[provider]
+
+
+def parse_retry_after(value):
+    """
+    Parses a Retry-After header (delay in seconds or an HTTP date) into seconds; None if absent or invalid.
+    """
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def rate_limit_details(error):
+    """
+    Returns (is_rate_limited, retry_after_seconds) for an exception raised by a provider SDK.
+    """
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None) or getattr(error, "code", None)
+    if status == 429 or type(error).__name__ in ("ResourceExhausted", "TooManyRequests"):
+        headers = getattr(response, "headers", None) or {}
+        return True, parse_retry_after(headers.get("Retry-After"))
+    return False, None
+
+
+def rate_limited_call(provider, func, *args, **kwargs):
+    """
+    Calls func through the provider's limiter, retrying up to RATE_LIMIT_RETRIES times on 429s.
+    Other exceptions (and a final 429) propagate to the caller.
+    """
+    limiter = get_limiter(provider)
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        limiter.acquire()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            is_rate_limited, retry_after = rate_limit_details(e)
+            if not is_rate_limited:
+                raise
+            limiter.on_rate_limited(retry_after)
+            metrics.increment("rate_limited", provider=provider)
+            if attempt == RATE_LIMIT_RETRIES:
+                raise
+            print(f"[Rate Limit]: {provider} returned 429, backing off (attempt {attempt + 1})")
+            continue
+        limiter.on_success()
+        return result
@@ -0,0 +1,87 @@
+# helper/response_cache.py
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# SQLite-backed cache of Gemini responses keyed on (model name, prompt hash)
+GEMINI_CACHE_PATH = os.getenv("GEMINI_CACHE_PATH", "gemini_cache.db")
+GEMINI_CACHE_TTL_SECONDS = int(os.getenv("GEMINI_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+GEMINI_CACHE_MAX_ENTRIES = int(os.getenv("GEMINI_CACHE_MAX_ENTRIES", "10000"))
+GEMINI_CACHE_ENABLED = os.getenv("GEMINI_CACHE_DISABLED", "").lower() not in ("1", "true", "yes")
+
+_lock = threading.Lock()
+_conn = None
+
+
+def _connection():
+    global _conn
+    if _conn is None:
+        _conn = sqlite3.connect(GEMINI_CACHE_PATH, check_same_thread=False)
+        _conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, response TEXT, created_at REAL, accessed_at REAL)"
+        )
+        _conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        _conn.commit()
+    return _conn
+
+
+def cache_key(model_name, prompt):
+    return hashlib.sha256(f"{model_name}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+def get_cached_response(model_name, prompt):
+    """
+    Returns the cached response for this model/prompt, or None if missing, expired or caching is disabled.
+    """
+    if not GEMINI_CACHE_ENABLED:
+        return None
+    key = cache_key(model_name, prompt)
+    now = time.time()
+    with _lock:
+        conn = _connection()
+        row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        response, created_at = row
+        if now - created_at > GEMINI_CACHE_TTL_SECONDS:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            conn.commit()
+            return None
+        conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        return response
+
+
+def store_response(model_name, prompt, response):
+    """
+    Stores a response and trims the cache to GEMINI_CACHE_MAX_ENTRIES, dropping least-recently-used entries.
+    """
+    if not GEMINI_CACHE_ENABLED:
+        return
+    now = time.time()
+    with _lock:
+        conn = _connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, model, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (cache_key(model_name, prompt), model_name, response, now, now)
+        )
+        conn.execute(
+            "DELETE FROM responses WHERE key IN "
+            "(SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (GEMINI_CACHE_MAX_ENTRIES,)
+        )
+        conn.commit()
+
+
+def clear_cache():
+    with _lock:
+        conn = _connection()
+        conn.execute("DELETE FROM responses")
+        conn.commit()
@@ -1,75 +1,350 @@
-from apscheduler.schedulers.background import BackgroundScheduler
+import os
+import random
+import socket
+import threading
+from apscheduler.util import obj_to_ref, ref_to_obj
 from datetime import datetime, timedelta
 
-scheduler = BackgroundScheduler()
-scheduler.start()
+from helper import job_store
+from helper import metrics
+from helper.image_generator import release_campaign_images
+from helper.job_store import JOB_STORE_PATH
 
-# In-memory store for job statuses keyed by job_id
-job_statuses = {}
+# "dispatcher": one worker drains due sends from the time-ordered jobs table in batches.
+# "workers": the same draining is left to separate worker processes (outreach_cli.py worker);
+#            the app only schedules.
+# "jobs": one APScheduler date job per email (the original behaviour).
+SCHEDULER_MODE = os.getenv("SCHEDULER_MODE", "dispatcher")
+DISPATCH_INTERVAL_SECONDS = int(os.getenv("DISPATCH_INTERVAL_SECONDS", "5"))
+DISPATCH_BATCH_SIZE = int(os.getenv("DISPATCH_BATCH_SIZE", "500"))
+
+# Transient failures (network errors, 429s, 5xx) are re-queued with exponential backoff and jitter;
+# after SEND_MAX_ATTEMPTS tries, or on any other failure, the send goes to the dead-letter list
+SEND_MAX_ATTEMPTS = int(os.getenv("SEND_MAX_ATTEMPTS", "5"))
+RETRY_BASE_DELAY_SECONDS = float(os.getenv("RETRY_BASE_DELAY_SECONDS", "30"))
+RETRY_MAX_DELAY_SECONDS = float(os.getenv("RETRY_MAX_DELAY_SECONDS", "3600"))
+
+# How late a send may still run after downtime; unset means run late rather than silently drop it
+_misfire_grace = os.getenv("SEND_MISFIRE_GRACE_SECONDS")
+SEND_MISFIRE_GRACE_SECONDS = int(_misfire_grace) if _misfire_grace else None
+
+# Created by start_scheduler(); importing this module never starts a scheduler thread
+scheduler = None
+_scheduler_lock = threading.Lock()
+
+def start_scheduler():
+    """
+    Starts the background scheduler once per process (later calls return the running one) and,
+    in dispatcher mode, registers the dispatcher that sends due emails.
+    Call this from the process that should send: the app, or outreach_cli.py serve.
+    """
+    global scheduler
+    with _scheduler_lock:
+        if scheduler is None:
+            from apscheduler.schedulers.background import BackgroundScheduler
+            from apscheduler.jobstores.memory import MemoryJobStore
+            from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
+
+            # Pending sends persist in SQLite so they survive process restarts; the dispatcher is
+            # this process's own polling loop, so it lives in memory and dies with the process
+            scheduler = BackgroundScheduler(jobstores={
+                "default": SQLAlchemyJobStore(url=f"sqlite:///{JOB_STORE_PATH}"),
+                "memory": MemoryJobStore(),
+            })
+            scheduler.start()
+            # Older versions persisted the dispatcher in the default store, where it would reload in any mode
+            if scheduler.get_job("send_dispatcher", jobstore="default"):
+                scheduler.remove_job("send_dispatcher", jobstore="default")
+            if SCHEDULER_MODE == "dispatcher":
+                scheduler.add_job(
+                    dispatch_due_sends,
+                    'interval',
+                    seconds=DISPATCH_INTERVAL_SECONDS,
+                    id="send_dispatcher",
+                    jobstore="memory",
+                    replace_existing=True,
+                    max_instances=1,
+                    coalesce=True
+                )
+        return scheduler
 
 def update_job_status(job_id, status):
-    if job_id in job_statuses:
-        job_statuses[job_id]['status'] = status
+    job_store.set_job_status(job_id, status)
 
 def get_all_jobs():
-    return job_statuses
+    return job_store.get_all_jobs()
+
+def get_campaign_summaries():
+    """
+    Returns {campaign_id: {"scheduled", "sending", "sent", "failed", ...}} from the per-campaign counters.
+    """
+    return job_store.get_campaign_summaries()
+
+def get_campaign_progress(now=None):
+    """
+    Dashboard view of every active campaign, built from the counters alone: the status counts plus
+    total, done, progress (0-1), rate (finished sends per minute, None during the first minute)
+    and eta (datetime of the expected last send, or None).
+    """
+    now = (now or datetime.now()).timestamp()
+    progress = {}
+    for campaign_id, counts in job_store.get_campaign_summaries().items():
+        done = counts["sent"] + counts["failed"]
+        remaining = counts["scheduled"] + counts["sending"]
+        total = done + remaining
+        elapsed = now - counts["started_at"] if counts["started_at"] else 0
+        rate = done / elapsed * 60 if elapsed >= 60 else None
+        # Sends can't finish before their scheduled times, nor faster than the observed rate
+        eta = counts["last_send_at"]
+        if rate and remaining:
+            eta = max(eta or 0, now + remaining / rate * 60)
+        progress[campaign_id] = dict(
+            counts,
+            total=total,
+            done=done,
+            progress=done / total if total else 1.0,
+            rate=rate,
+            eta=datetime.fromtimestamp(eta) if eta and remaining else None
+        )
+    return progress
 
 def cancel_campaign(campaign_id):
     """
     Cancels all scheduled jobs for the specified campaign and removes their status entries.
     Returns the count of removed jobs.
     """
-    to_remove = []
-    for job_id, info in list(job_statuses.items()):
-        if info.get('campaign_id') == campaign_id:
+    if SCHEDULER_MODE == "jobs":
+        running_scheduler = start_scheduler()
+        for job_id in job_store.get_campaign_job_ids(campaign_id):
             try:
-                scheduler.remove_job(job_id)
+                running_scheduler.remove_job(job_id)
             except Exception:
                 # Job might already be executed or removed
                 pass
-            to_remove.append(job_id)
-    for job_id in to_remove:
-        job_statuses.pop(job_id, None)
-    return len(to_remove)
+    # In dispatcher mode removing the rows is enough: the dispatcher only sees what is in the table
+    removed = job_store.delete_campaign(campaign_id)
+    _release_images(campaign_id)
+    return removed
 
-def schedule_batch_emails(send_func, start_datetime, end_datetime, total_emails, campaign_id, **kwargs):
+def _is_retryable(status):
+    return status == 429 or status >= 500
+
+def retry_delay_seconds(attempt):
     """
-    Schedule emails evenly spaced between start_datetime and end_datetime, associating all emails
-    with a campaign_id for tracking and cancellation.
-    """
-    interval_seconds = (end_datetime - start_datetime).total_seconds() / max(1, total_emails - 1)
-    for i in range(total_emails):
-        send_time = start_datetime + timedelta(seconds=i * interval_seconds)
-        job_id = f"email_{send_time.timestamp()}_{campaign_id}_{i}"
-
-        def job_wrapper(job_id=job_id, send_func=send_func, campaign_id=campaign_id, **kwargs):
-            update_job_status(job_id, "sending")
-            status, res = send_func(**kwargs)
-            if status == 200:
-                update_job_status(job_id, "sent ✅")
+    Backoff before retry number attempt (1-based): doubles each time up to RETRY_MAX_DELAY_SECONDS,
+    scaled by a random 50-150% so failed sends from one burst don't all retry together.
+    """
+    delay = min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * (2 ** (attempt - 1)))
+    return delay * random.uniform(0.5, 1.5)
+
+def _missing_content_outcome(job):
+    print(f"[Scheduler Error]: Content for job {job['job_id']} is missing; dead-lettering it")
+    return {"job_id": job["job_id"], "outcome": "dead", "error": "Email content missing from the job store"}
+
+def _send_outcome(job, status, error=None):
+    if status == 200:
+        return {"job_id": job["job_id"], "outcome": "sent"}
+    error = error or f"HTTP {status}"
+    attempt = (job.get("attempts") or 0) + 1
+    if _is_retryable(status) and attempt < SEND_MAX_ATTEMPTS:
+        return {
+            "job_id": job["job_id"],
+            "outcome": "retry",
+            "next_send_time": datetime.now() + timedelta(seconds=retry_delay_seconds(attempt)),
+            "error": error
+        }
+    return {"job_id": job["job_id"], "outcome": "dead", "error": error}
+
+def _record_outcomes(outcomes, owner=None):
+    job_store.record_send_results(outcomes, owner=owner)
+    for outcome in outcomes:
+        metrics.increment("sends", outcome=outcome["outcome"])
+    if SCHEDULER_MODE == "jobs":
+        # Re-queued sends need a new date job; the dispatcher just sees the updated send_time
+        for outcome in outcomes:
+            if outcome["outcome"] == "retry":
+                _add_date_job(outcome["job_id"], outcome["next_send_time"])
+
+def seal_campaign(campaign_id):
+    """
+    Call after the last schedule_batch_emails call of a campaign. Until then the campaign's content
+    and counters are never cleaned up, even when every send scheduled so far has finished.
+    """
+    job_store.seal_campaign(campaign_id)
+    _cleanup_campaigns([campaign_id])
+
+def _release_images(campaign_id):
+    # Dead letters can still be re-sent with the campaign's pinned images
+    if not job_store.get_dead_letters(campaign_id):
+        release_campaign_images(campaign_id)
+
+def _cleanup_campaigns(campaign_ids):
+    # Cleanup statuses when all jobs in a sealed campaign are done
+    for campaign_id in set(campaign_ids):
+        if job_store.campaign_finished(campaign_id):
+            job_store.delete_campaign(campaign_id)
+            _release_images(campaign_id)
+
+def _send_one(send_func_ref, payload):
+    try:
+        status, res = ref_to_obj(send_func_ref)(**payload)
+    except Exception as e:
+        print(f"[Scheduler Error]: Send failed: {e}")
+        return 500, str(e)
+    return status, None if status == 200 else str(res)[:500]
+
+def run_scheduled_email(job_id):
+    """
+    Scheduler entry point for one email in "jobs" mode. Only job_id is stored with the APScheduler job;
+    the recipient, content and send function are loaded from the job store.
+    """
+    owner = _worker_id()
+    # Leased like a dispatcher claim, so no dispatcher or worker can reclaim and resend it mid-send
+    job = job_store.claim_job(job_id, owner)
+    if job is None:
+        # Cancelled after this run was queued, or already sent or being sent elsewhere
+        return
+    metrics.observe("scheduler_lag", max(0.0, (datetime.now() - job["send_time"]).total_seconds()))
+    send_func_ref, payload = job_store.get_content(job["content_id"])
+    if payload is None:
+        _record_outcomes([_missing_content_outcome(job)], owner=owner)
+        return
+
+    status, error = _send_one(send_func_ref, payload)
+    _record_outcomes([_send_outcome(job, status, error)], owner=owner)
+    _cleanup_campaigns([job["campaign_id"]])
+
+def _add_date_job(job_id, run_date):
+    # Jobs only reach the SQLite job store once the scheduler is running
+    start_scheduler().add_job(
+        run_scheduled_email,
+        'date',
+        run_date=run_date,
+        id=job_id,
+        args=[job_id],
+        misfire_grace_time=SEND_MISFIRE_GRACE_SECONDS,
+        replace_existing=True
+    )
+
+def _worker_id():
+    # Evaluated per call so forked worker processes get their own id
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def lease_holders_elsewhere():
+    """
+    Hosts other than this one that hold unexpired send leases in the job store; should be empty.
+    """
+    this_host = socket.gethostname()
+    return {owner.rsplit(":", 1)[0] for owner in job_store.get_lease_owners()} - {this_host}
+
+def dispatch_due_sends(owner=None):
+    """
+    Dispatcher loop: leases everything due from the time-ordered jobs table in batches of
+    DISPATCH_BATCH_SIZE. Sends sharing a bulk send function go out together through it
+    (e.g. one Mailjet request per 50 messages); the rest are sent one by one.
+    Any number of processes on the store's host may run this against the same job store; leases keep
+    them from sending the same job twice, and a crashed process's jobs are retaken when its leases expire.
+    SQLite locking does not hold across machines, so processes on other hosts must not share the file.
+    """
+    owner = owner or _worker_id()
+    while True:
+        now = datetime.now()
+        due = job_store.claim_due_jobs(now, DISPATCH_BATCH_SIZE, owner=owner)
+        if not due:
+            return
+        # How late each send is picked up relative to its scheduled time
+        for job in due:
+            metrics.observe("scheduler_lag", max(0.0, (now - job["send_time"]).total_seconds()))
+        contents = job_store.get_contents(job["content_id"] for job in due)
+
+        groups = {}
+        outcomes = []
+        for job in due:
+            if job["content_id"] not in contents:
+                outcomes.append(_missing_content_outcome(job))
+                continue
+            send_func_ref, bulk_send_func_ref, payload = contents[job["content_id"]]
+            groups.setdefault((send_func_ref, bulk_send_func_ref), []).append((job, payload))
+
+        for (send_func_ref, bulk_send_func_ref), items in groups.items():
+            if bulk_send_func_ref:
+                try:
+                    results = ref_to_obj(bulk_send_func_ref)([payload for _, payload in items])
+                    results = [(status, None if status == 200 else str(res)[:500]) for status, res in results]
+                except Exception as e:
+                    print(f"[Scheduler Error]: Bulk send of {len(items)} emails failed: {e}")
+                    results = [(500, str(e))] * len(items)
             else:
-                update_job_status(job_id, "failed ❌")
+                results = [_send_one(send_func_ref, payload) for _, payload in items]
+            outcomes.extend(_send_outcome(job, status, error) for (job, _), (status, error) in zip(items, results))
 
-            # Cleanup statuses when all jobs in the campaign are done
-            campaign_jobs = [j for j, info in job_statuses.items() if info.get('campaign_id') == campaign_id]
-            if all(job_statuses[j]['status'] in ['sent ✅', 'failed ❌'] for j in campaign_jobs):
-                for j in campaign_jobs:
-                    job_statuses.pop(j, None)
+        _record_outcomes(outcomes, owner=owner)
+        _cleanup_campaigns(job["campaign_id"] for job in due)
+        if len(due) < DISPATCH_BATCH_SIZE:
+            return
 
-        kwargs_copy = kwargs.copy()
-        job_statuses[job_id] = {
-            "status": "scheduled",
+def run_send_worker(poll_interval=DISPATCH_INTERVAL_SECONDS, stop_event=None):
+    """
+    Runs dispatch_due_sends every poll_interval seconds until stop_event is set (or forever).
+    This is the body of an out-of-process send worker; see outreach_cli.py worker.
+    """
+    owner = _worker_id()
+    stop_event = stop_event or threading.Event()
+    print(f"[Send Worker]: {owner} polling {JOB_STORE_PATH} every {poll_interval}s")
+    while not stop_event.is_set():
+        try:
+            dispatch_due_sends(owner)
+        except Exception as e:
+            # A locked or briefly unavailable store shouldn't kill the worker
+            print(f"[Send Worker Error]: {e}")
+        stop_event.wait(poll_interval)
+
+def schedule_batch_emails(send_func, start_datetime, end_datetime, total_emails, campaign_id,
+                          bulk_send_func=None, send_times=None, **kwargs):
+    """
+    Schedule emails evenly spaced between start_datetime and end_datetime, associating all emails
+    with a campaign_id for tracking and cancellation. Pass send_times (e.g. from
+    send_planner.SendPlanner.send_times) to use those exact times instead; total_emails is then ignored.
+    send_func (and the optional bulk_send_func, which takes a list of kwargs dicts and returns one
+    (status, response) per entry) must be module-level functions so they can be stored by reference;
+    kwargs are stored once per call and shared by all of its jobs.
+    """
+    content_id = job_store.save_content(
+        campaign_id, obj_to_ref(send_func), kwargs,
+        bulk_send_func_ref=obj_to_ref(bulk_send_func) if bulk_send_func else None
+    )
+    if send_times is None:
+        interval_seconds = (end_datetime - start_datetime).total_seconds() / max(1, total_emails - 1)
+        send_times = [start_datetime + timedelta(seconds=i * interval_seconds) for i in range(total_emails)]
+    jobs = []
+    for i, send_time in enumerate(send_times):
+        jobs.append({
+            "job_id": f"email_{send_time.timestamp()}_{campaign_id}_{content_id}_{i}",
+            "campaign_id": campaign_id,
+            "content_id": content_id,
             "send_time": send_time,
-            "recipient": kwargs.get("recipient", "N/A"),
-            "campaign_id": campaign_id
-        }
+            "recipient": kwargs.get("recipient", "N/A")
+        })
+    job_store.add_jobs(jobs)
 
-        scheduler.add_job(
-            job_wrapper,
-            'date',
-            run_date=send_time,
-            id=job_id,
-            kwargs=kwargs_copy,
-            misfire_grace_time=300
-        )
+    if SCHEDULER_MODE == "jobs":
+        for job in jobs:
+            _add_date_job(job["job_id"], job["send_time"])
     return True
+
+def get_dead_letters(campaign_id=None):
+    """
+    Returns sends that failed permanently or ran out of retries, newest first.
+    """
+    return job_store.get_dead_letters(campaign_id)
+
+def resend_dead_letters(dead_letter_ids=None):
+    """
+    Re-queues dead letters (all of them by default) to be sent right away with a fresh attempt count.
+    Returns the number of sends re-queued.
+    """
+    jobs = job_store.requeue_dead_letters(dead_letter_ids)
+    if SCHEDULER_MODE == "jobs":
+        for job in jobs:
+            _add_date_job(job["job_id"], job["send_time"])
+    return len(jobs)
@@ -0,0 +1,64 @@
+# helper/send_planner.py
+
+import os
+import random
+from datetime import timedelta
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Campaign-wide send rate ceiling (0 = none); a window too short for it is stretched
+SEND_MAX_PER_MINUTE = float(os.getenv("SEND_MAX_PER_MINUTE", "0"))
+# Most sends due within any one second, e.g. when start and end are the same moment
+SEND_BURST_SIZE = int(os.getenv("SEND_BURST_SIZE", "50"))
+# Random offset applied to each send time, as a fraction of the gap between consecutive sends;
+# it only uses the slack above the rate-limited minimum gap
+SEND_JITTER = float(os.getenv("SEND_JITTER", "0.5"))
+
+
+class SendPlanner:
+    """
+    Spreads every send of a campaign (recipient_count x emails_per_recipient) evenly over
+    [start, end] instead of giving each recipient the same timestamps. Email i of every recipient
+    comes before email i + 1 of any recipient, and recipients take turns within each round.
+    Adjacent sends, jitter included, are never closer than max_per_minute and burst_size allow;
+    when the window is too short for that, the plan runs past end (see stretched and self.end)
+    and the times carry no jitter.
+    """
+
+    def __init__(self, start, end, recipient_count, emails_per_recipient=1, max_per_minute=SEND_MAX_PER_MINUTE,
+                 burst_size=SEND_BURST_SIZE, jitter=SEND_JITTER, seed=None):
+        self.start = start
+        self.recipient_count = max(1, recipient_count)
+        self.emails_per_recipient = max(1, emails_per_recipient)
+        self.total = self.recipient_count * self.emails_per_recipient
+
+        window = max(0.0, (end - start).total_seconds())
+        min_gap = 0.0
+        if max_per_minute:
+            min_gap = max(min_gap, 60.0 / max_per_minute)
+        if burst_size:
+            min_gap = max(min_gap, 1.0 / burst_size)
+        gap = window / (self.total - 1) if self.total > 1 else 0.0
+        self.min_gap = min_gap
+        self.gap = max(gap, min_gap)
+        self.end = start + timedelta(seconds=self.gap * (self.total - 1))
+        self.stretched = self.end > end
+        self.jitter = min(max(jitter, 0.0), 1.0)
+        # Two neighbours can move up to half the span towards each other, so the span is capped at the slack
+        self._jitter_span = min(self.jitter * self.gap, self.gap - min_gap)
+        self._random = random.Random(seed)
+
+    def _send_time(self, slot):
+        # Jitter stays within half the span either side, so sends never swap order or leave the plan
+        offset = slot * self.gap + (self._random.random() - 0.5) * self._jitter_span
+        return self.start + timedelta(seconds=min(max(offset, 0.0), self.gap * (self.total - 1)))
+
+    def send_times(self, recipient_index):
+        """
+        Returns the emails_per_recipient send times for the recipient at recipient_index (0-based).
+        """
+        return [
+            self._send_time(i * self.recipient_count + recipient_index % self.recipient_count)
+            for i in range(self.emails_per_recipient)
+        ]
@@ -0,0 +1,94 @@
+# helper/token_usage.py
+
+import os
+import math
+
+from helper import job_store, metrics
+
+# USD per million tokens; defaults are gemini-2.5-flash list prices (thinking tokens bill as output)
+GEMINI_INPUT_USD_PER_MTOK = float(os.getenv("GEMINI_INPUT_USD_PER_MTOK", "0.30"))
+GEMINI_OUTPUT_USD_PER_MTOK = float(os.getenv("GEMINI_OUTPUT_USD_PER_MTOK", "2.50"))
+
+# Estimate inputs. Response size per email is taken from recorded usage once there is any;
+# call latency is modelled as a fixed overhead plus output tokens at a steady generation speed.
+CHARS_PER_TOKEN = 4
+EXPECTED_RESPONSE_TOKENS = int(os.getenv("EXPECTED_RESPONSE_TOKENS", "350"))
+GEMINI_CALL_OVERHEAD_SECONDS = float(os.getenv("GEMINI_CALL_OVERHEAD_SECONDS", "1.0"))
+GEMINI_OUTPUT_TOKENS_PER_SECOND = float(os.getenv("GEMINI_OUTPUT_TOKENS_PER_SECOND", "150"))
+
+
+def usage_from_response(response):
+    """
+    Returns (prompt_tokens, response_tokens) from a Gemini response's usage_metadata, or (0, 0) if it has none.
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return 0, 0
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    response_tokens = (getattr(usage, "candidates_token_count", 0) or 0) + (getattr(usage, "thoughts_token_count", 0) or 0)
+    return prompt_tokens, response_tokens
+
+
+def record_usage(response, campaign_id=None, emails=1):
+    """
+    Counts one Gemini call's tokens in the metrics and, when campaign_id is given, adds them to the
+    campaign's running totals in the job store. emails is how many emails the call produced.
+    """
+    prompt_tokens, response_tokens = usage_from_response(response)
+    metrics.increment("gemini_tokens", prompt_tokens, kind="prompt")
+    metrics.increment("gemini_tokens", response_tokens, kind="response")
+    if campaign_id:
+        try:
+            job_store.add_token_usage(campaign_id, prompt_tokens, response_tokens, emails)
+        except Exception as e:
+            # Accounting must never fail the email it is accounting for
+            print(f"[Token Usage Error]: Could not record usage for campaign {campaign_id}: {e}")
+    return prompt_tokens, response_tokens
+
+
+def cost_usd(prompt_tokens, response_tokens):
+    return (prompt_tokens * GEMINI_INPUT_USD_PER_MTOK + response_tokens * GEMINI_OUTPUT_USD_PER_MTOK) / 1e6
+
+
+def get_campaign_usage(campaign_id=None):
+    """
+    Returns {campaign_id: {"calls", "emails", "prompt_tokens", "response_tokens", "cost_usd"}}.
+    """
+    usage = job_store.get_token_usage(campaign_id)
+    for totals in usage.values():
+        totals["cost_usd"] = cost_usd(totals["prompt_tokens"], totals["response_tokens"])
+    return usage
+
+
+def estimate_tokens(text):
+    # Rough count for estimates only; billing uses the counts Gemini reports
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def response_tokens_per_email():
+    totals = job_store.get_token_usage().values()
+    emails = sum(entry["emails"] for entry in totals)
+    if not emails:
+        return EXPECTED_RESPONSE_TOKENS
+    return sum(entry["response_tokens"] for entry in totals) / emails
+
+
+def estimate(calls, prompt_tokens, emails, concurrency=1, rate_per_sec=None):
+    """
+    Pre-run estimate for calls Gemini requests that send prompt_tokens in total and produce emails
+    emails. Returns {"calls", "prompt_tokens", "response_tokens", "cost_usd", "seconds"}; seconds is
+    the generation wall time with calls spread over concurrency workers and capped at rate_per_sec.
+    Cache hits would make the real run cheaper and faster.
+    """
+    response_tokens = round(emails * response_tokens_per_email())
+    call_seconds = GEMINI_CALL_OVERHEAD_SECONDS + response_tokens / max(calls, 1) / GEMINI_OUTPUT_TOKENS_PER_SECOND
+    seconds = math.ceil(calls / max(concurrency, 1)) * call_seconds
+    if rate_per_sec:
+        seconds = max(seconds, calls / rate_per_sec)
+    return {
+        "calls": calls,
+        "prompt_tokens": prompt_tokens,
+        "response_tokens": response_tokens,
+        "cost_usd": cost_usd(prompt_tokens, response_tokens),
+        "seconds": seconds if calls else 0.0,
+    }
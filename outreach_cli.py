@@ -0,0 +1,343 @@
+"""
+Headless campaign runner for large contact lists.
+
+    python outreach_cli.py run contacts.csv campaign.json [--estimate]
+    python outreach_cli.py serve
+    python outreach_cli.py worker --processes 4
+
+"run" ingests the contact file, generates every email and schedules it without a browser session.
+Progress is appended to a state file (default: <config>.state.jsonl), so re-running the same
+command after an interruption skips recipients that were already scheduled. Before generating,
+"run" prints the expected Gemini calls, tokens, cost and generation time; --estimate stops there.
+"serve" keeps the scheduler running so scheduled emails go out from this machine.
+"worker" runs send workers that lease due emails from the job store (JOB_STORE_PATH). Start as
+many processes as you need on the machine that holds the store; pair them with
+SCHEDULER_MODE=workers so the app only schedules. SQLite's WAL mode and locking only work within
+one host, so never point workers on other machines at the same file (e.g. over a network share).
+
+Campaign config (JSON):
+    template_type, topic, goal, start, end       required; start/end are ISO datetimes
+    tone, context, image_description             optional; the image description is generated by AI if omitted
+    generation_mode                              "ai" (one email per recipient, default) or "variants"
+    variant_count, total_emails                  defaults 3 and 1
+    sender_name, sender_title, sender_contact    default to SENDER_NAME / SENDER_TITLE / SENDER_CONTACT env vars
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import signal
+import argparse
+from datetime import datetime, timedelta
+from itertools import islice
+
+from helper.contact_ingest import IngestReport, iter_contacts, email_key
+from helper.gemini_helper import generate_image_description_with_gemini
+from helper.prompt_templates import EMAIL_PROMPT_TEMPLATES
+from helper.generation_pipeline import generate_previews, generate_variant_previews, estimate_generation
+from helper.personalization import build_variant_prompts
+from helper.token_usage import get_campaign_usage
+from helper.send_planner import SendPlanner
+from helper.image_generator import pin_image
+from helper.mailjet_helper import send_test_email, send_bulk_emails
+from helper.scheduler_helper import (
+    schedule_batch_emails, seal_campaign, start_scheduler, run_send_worker, lease_holders_elsewhere,
+    SCHEDULER_MODE, DISPATCH_INTERVAL_SECONDS
+)
+from helper.job_store import JOB_STORE_PATH, close_connection
+from helper import metrics, rate_limiter
+
+# Recipients generated per pipeline run; bounds how many previews are held in memory at once
+CLI_CHUNK_SIZE = int(os.getenv("CLI_CHUNK_SIZE", "200"))
+REQUIRED_CONFIG_KEYS = ("template_type", "topic", "goal", "start", "end")
+
+
+def load_config(path):
+    with open(path) as f:
+        config = json.load(f)
+    missing = [key for key in REQUIRED_CONFIG_KEYS if not config.get(key)]
+    if missing:
+        raise ValueError(f"Campaign config is missing: {', '.join(missing)}")
+    if config["template_type"] not in EMAIL_PROMPT_TEMPLATES:
+        raise ValueError(f"Unknown template_type {config['template_type']!r}; choose from {', '.join(EMAIL_PROMPT_TEMPLATES)}")
+
+    config.setdefault("tone", "professional")
+    config["context"] = config.get("context") or "None provided"
+    config.setdefault("generation_mode", "ai")
+    config.setdefault("variant_count", 3)
+    config.setdefault("total_emails", 1)
+    for key in ("sender_name", "sender_title", "sender_contact"):
+        config[key] = config.get(key) or os.environ.get(key.upper(), "")
+        if not config[key]:
+            raise ValueError(f"Campaign config is missing {key} (or set {key.upper()})")
+    config["start"] = datetime.fromisoformat(config["start"])
+    config["end"] = datetime.fromisoformat(config["end"])
+    return config
+
+
+def load_state(path):
+    """
+    Returns (state, scheduled) from a state file: state holds the run-level fields written first
+    (campaign_id, image_description) and scheduled is the set of email_key digests already done.
+    """
+    state, scheduled = {}, set()
+    if not os.path.exists(path):
+        return state, scheduled
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn last line from a crash mid-write; that recipient is simply redone
+                continue
+            if "scheduled" in record:
+                scheduled.add(email_key(record["scheduled"]))
+            else:
+                state.update(record)
+    return state, scheduled
+
+
+def _append_state(f, record):
+    f.write(json.dumps(record) + "\n")
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def _prompt_fields(config):
+    return {
+        "email_topic": config["topic"],
+        "tone": config["tone"],
+        "context": config["context"],
+        "goal": config["goal"]
+    }
+
+
+def estimate_run(config, recipient_count):
+    """
+    Returns the generation_pipeline.estimate_generation estimate for recipient_count new recipients.
+    """
+    template = EMAIL_PROMPT_TEMPLATES[config["template_type"]]
+    if config["generation_mode"] == "variants":
+        sample_prompt = build_variant_prompts(template, config["variant_count"], **_prompt_fields(config))[0]
+        return estimate_generation(sample_prompt, config["variant_count"] if recipient_count else 0, batch_size=1)
+    sample_prompt = template.format(recipient_name="Alex Morgan", **_prompt_fields(config))
+    return estimate_generation(sample_prompt, recipient_count)
+
+
+def _preview_stream(config, contacts, image_description, campaign_id):
+    fields = _prompt_fields(config)
+    template = EMAIL_PROMPT_TEMPLATES[config["template_type"]]
+    if config["generation_mode"] == "variants":
+        # Drafts are generated once up front; personalization then streams through the contacts
+        for _, preview in generate_variant_previews(
+            contacts, template, config["variant_count"], image_description, campaign_id=campaign_id, **fields
+        ):
+            yield preview
+        return
+
+    def build_prompt(entry):
+        return template.format(recipient_name=entry["Names"], **fields)
+
+    for chunk in _chunks(contacts, CLI_CHUNK_SIZE):
+        for _, preview in generate_previews(chunk, build_prompt, image_description, campaign_id=campaign_id):
+            yield preview
+
+
+def run_campaign(contacts_path, config_path, state_path=None, estimate_only=False):
+    config = load_config(config_path)
+    state_path = state_path or f"{config_path}.state.jsonl"
+    state, scheduled = load_state(state_path)
+    if scheduled:
+        print(f"[CLI]: Resuming from {state_path}: {len(scheduled)} recipients already scheduled")
+
+    # One extra streaming pass over the file; cheap next to generating the emails
+    remaining = sum(
+        email_key(contact["Emails"]) not in scheduled
+        for contact in iter_contacts(contacts_path, contacts_path, IngestReport())
+    )
+    estimate = estimate_run(config, remaining)
+    print(
+        f"[CLI]: Estimate for {remaining} recipients: {estimate['calls']} Gemini calls, "
+        f"~{estimate['prompt_tokens']} prompt + ~{estimate['response_tokens']} response tokens, "
+        f"~${estimate['cost_usd']:.2f}, ~{timedelta(seconds=round(estimate['seconds']))} of generation"
+    )
+    if estimate_only:
+        return 0
+
+    with open(state_path, "a") as state_file:
+        if "campaign_id" not in state:
+            state["campaign_id"] = str(uuid.uuid4())
+            _append_state(state_file, {"campaign_id": state["campaign_id"]})
+        if "image_description" not in state:
+            # Kept in the state file so a resumed run reuses the same (cached) image
+            state["image_description"] = config.get("image_description") or generate_image_description_with_gemini(
+                topic=config["topic"], context=config["context"], goal=config["goal"], campaign_id=state["campaign_id"]
+            )
+            _append_state(state_file, {"image_description": state["image_description"]})
+        print(f"[CLI]: Campaign {state['campaign_id']}, image: {state['image_description']}")
+
+        report = IngestReport()
+        contacts = (
+            contact for contact in iter_contacts(contacts_path, contacts_path, report)
+            if email_key(contact["Emails"]) not in scheduled
+        )
+
+        # Planned over the whole list; recipients scheduled by earlier runs keep the first slots
+        planner = SendPlanner(
+            config["start"], config["end"], len(scheduled) + remaining, config["total_emails"], seed=state["campaign_id"]
+        )
+        if planner.stretched:
+            print(f"[CLI]: Send window stretched to {planner.end.isoformat(timespec='seconds')} to respect the send rate limits")
+
+        done = 0
+        failed = 0
+        started_at = time.monotonic()
+        for preview in _preview_stream(config, contacts, state["image_description"], state["campaign_id"]):
+            if preview["img_path"] is None:
+                raise RuntimeError("Failed to generate or download a fallback image.")
+            if preview["error"]:
+                # Left out of the state file, so the next run generates this recipient again
+                print(f"[CLI Error]: Skipped {preview['recipient_email']}: {preview['error']}")
+                failed += 1
+                continue
+            # Every recipient's jobs belong to the one campaign; job ids stay unique via content_id
+            schedule_batch_emails(
+                send_func=send_test_email,
+                bulk_send_func=send_bulk_emails,
+                start_datetime=config["start"],
+                end_datetime=config["end"],
+                total_emails=config["total_emails"],
+                send_times=planner.send_times(len(scheduled) + done),
+                campaign_id=state["campaign_id"],
+                recipient=preview["recipient_email"],
+                subject=preview["subject"],
+                body=preview["body"],
+                image_path=pin_image(preview["img_path"], state["campaign_id"]),
+                sender_name=config["sender_name"],
+                sender_title=config["sender_title"],
+                sender_contact=config["sender_contact"]
+            )
+            _append_state(state_file, {"scheduled": preview["recipient_email"]})
+            done += 1
+            if done % 50 == 0:
+                rate = done / max(time.monotonic() - started_at, 1e-9)
+                print(f"[CLI]: Scheduled {done} recipients ({rate:.1f}/s)")
+        # Only a run that got through the whole file seals; an interrupted one is resumed into the same campaign
+        if failed:
+            print(f"[CLI]: {failed} recipients failed to generate; run the same command again to retry them")
+        else:
+            seal_campaign(state["campaign_id"])
+
+    print(
+        f"[CLI]: Done. Scheduled {done} new recipients ({len(scheduled)} from earlier runs). "
+        f"Rows read: {report.total_rows}, skipped: {report.missing_fields} missing fields, "
+        f"{report.invalid_emails} invalid, {report.duplicates} duplicates."
+    )
+    usage = get_campaign_usage(state["campaign_id"]).get(state["campaign_id"])
+    if usage:
+        print(
+            f"[CLI]: Gemini usage so far: {usage['calls']} calls, {usage['prompt_tokens']} prompt + "
+            f"{usage['response_tokens']} response tokens, ${usage['cost_usd']:.2f}"
+        )
+    return done
+
+
+def serve():
+    scheduler = start_scheduler()
+    if metrics.start_metrics_server():
+        print(f"[CLI]: Metrics at http://localhost:{metrics.METRICS_PORT}/metrics")
+    print(f"[CLI]: Scheduler running in {SCHEDULER_MODE} mode. Press Ctrl+C to stop.")
+    try:
+        # The scheduler works on a background thread; keep the process alive for it
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        scheduler.shutdown()
+
+
+def _worker_process(poll_interval, stop_event, processes=1):
+    # The parent handles Ctrl+C and sets stop_event, so a batch in hand is never cut off mid-send
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # Token buckets live in each process, so the workers split the configured rates between them
+    rate_limiter.set_process_count(processes)
+    run_send_worker(poll_interval, stop_event)
+
+
+def worker(processes, poll_interval):
+    import multiprocessing
+
+    other_hosts = lease_holders_elsewhere()
+    if other_hosts:
+        raise RuntimeError(
+            f"Workers on {', '.join(sorted(other_hosts))} hold leases in {JOB_STORE_PATH}. "
+            "The SQLite job store only supports workers on one machine."
+        )
+    # Each child opens its own connection; the one used for the check must not be inherited across fork
+    close_connection()
+    if metrics.start_metrics_server():
+        print(f"[CLI]: Metrics at http://localhost:{metrics.METRICS_PORT}/metrics")
+    stop_event = multiprocessing.Event()
+    processes = max(1, processes)
+    children = [
+        multiprocessing.Process(target=_worker_process, args=(poll_interval, stop_event, processes), name=f"send-worker-{n}")
+        for n in range(processes)
+    ]
+    for child in children:
+        child.start()
+    try:
+        for child in children:
+            child.join()
+    except KeyboardInterrupt:
+        print("[CLI]: Stopping workers after their current batch...")
+        stop_event.set()
+        for child in children:
+            child.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run outreach campaigns without the Streamlit UI.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Generate and schedule a campaign for a contact file")
+    run_parser.add_argument("contacts", help="CSV or Excel file with Names and Emails columns")
+    run_parser.add_argument("config", help="Campaign config JSON file")
+    run_parser.add_argument("--state", help="Progress file used to resume (default: <config>.state.jsonl)")
+    run_parser.add_argument("--estimate", action="store_true", help="Print the cost and time estimate and exit")
+
+    subparsers.add_parser("serve", help="Run the scheduler so scheduled emails are sent")
+
+    worker_parser = subparsers.add_parser("worker", help="Run send workers that lease due emails from the job store")
+    worker_parser.add_argument("--processes", type=int, default=1, help="Worker processes to start (default 1)")
+    worker_parser.add_argument("--poll-interval", type=float, default=DISPATCH_INTERVAL_SECONDS,
+                               help="Seconds between polls for due emails")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        try:
+            run_campaign(args.contacts, args.config, args.state, args.estimate)
+        except (ValueError, RuntimeError) as e:
+            print(f"[CLI Error]: {e}", file=sys.stderr)
+            return 1
+    elif args.command == "worker":
+        try:
+            worker(args.processes, args.poll_interval)
+        except RuntimeError as e:
+            print(f"[CLI Error]: {e}", file=sys.stderr)
+            return 1
+    else:
+        serve()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,31 @@
+import pytest
+
+from helper.personalization import NAME_SLOT, build_variant_prompts, personalize, find_placeholders
+from helper.prompt_templates import EMAIL_PROMPT_TEMPLATES
+
+FIELDS = {"email_topic": "the spring launch", "tone": "friendly", "context": "None provided", "goal": "Book a demo"}
+
+
+def test_variant_prompts_ask_for_the_exact_name_slot():
+    prompts = build_variant_prompts(EMAIL_PROMPT_TEMPLATES["introduction"], 2, **FIELDS)
+    assert len(prompts) == 2
+    for prompt in prompts:
+        # Once in the formatted template and once in the variant instruction
+        assert prompt.count(NAME_SLOT) == 2
+        assert "RECIPIENT_NAME" not in prompt.replace(NAME_SLOT, "")
+
+
+def test_draft_that_follows_the_instruction_passes():
+    draft = f"Hi {NAME_SLOT}, thanks for joining."
+    assert not find_placeholders(draft.replace(NAME_SLOT, ""))
+    assert personalize(draft, "Priya") == "Hi Priya, thanks for joining."
+
+
+@pytest.mark.parametrize("name", ["Acme (EU)", "[Ops] Team", "{Lab}", "Jo ___ Smith"])
+def test_names_with_brackets_are_not_rejected(name):
+    assert personalize(f"Dear {NAME_SLOT},", name) == f"Dear {name},"
+
+
+def test_draft_with_placeholder_text_is_rejected():
+    with pytest.raises(ValueError):
+        personalize(f"Dear {NAME_SLOT}, see [link] for details.", "Priya")
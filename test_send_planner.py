@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from helper.send_planner import SendPlanner
+
+START = datetime(2026, 1, 5, 9, 0)
+
+
+def per_recipient_times(planner):
+    return [planner.send_times(r) for r in range(planner.recipient_count)]
+
+
+def all_times(planner, per_recipient=None):
+    # Recipient-major lists flattened into send order: round i, then recipient r.
+    # Jitter is drawn per call, so reuse per_recipient when checking both views of one plan.
+    per_recipient = per_recipient or per_recipient_times(planner)
+    return [per_recipient[r][i] for i in range(planner.emails_per_recipient) for r in range(planner.recipient_count)]
+
+
+def gaps(times):
+    return [(b - a).total_seconds() for a, b in zip(times, times[1:])]
+
+
+def test_sends_keep_slot_order_within_the_window():
+    planner = SendPlanner(START, START + timedelta(hours=1), 40, emails_per_recipient=3, jitter=1.0, seed=7)
+    per_recipient = per_recipient_times(planner)
+    times = all_times(planner, per_recipient)
+    assert times == sorted(times)
+    assert len(set(times)) == len(times)
+    assert times[0] >= START and times[-1] <= START + timedelta(hours=1)
+    assert not planner.stretched
+    for recipient_times in per_recipient:
+        assert recipient_times == sorted(recipient_times)
+
+
+def test_short_window_is_stretched_to_the_rate_limit():
+    planner = SendPlanner(START, START + timedelta(minutes=1), 120, max_per_minute=60, jitter=0.5, seed=1)
+    assert planner.stretched
+    assert planner.end == START + timedelta(seconds=119)
+    assert all(gap == pytest.approx(1.0) for gap in gaps(all_times(planner)))
+
+
+def test_zero_width_window_is_capped_by_burst_size():
+    planner = SendPlanner(START, START, 100, burst_size=50, max_per_minute=0, seed=3)
+    assert planner.stretched
+    assert min(gaps(all_times(planner))) >= 1 / 50 - 1e-6
+
+
+@pytest.mark.parametrize("jitter", [0.25, 0.5, 1.0])
+@pytest.mark.parametrize("window_minutes", [30, 59, 120, 600])
+def test_jitter_never_breaks_the_rate_limit(jitter, window_minutes):
+    planner = SendPlanner(
+        START, START + timedelta(minutes=window_minutes), 60, max_per_minute=1, jitter=jitter, seed=window_minutes
+    )
+    times = all_times(planner)
+    assert min(gaps(times)) >= 60 - 1e-6
+    for i, time in enumerate(times):
+        # No 60 s window holds more than max_per_minute sends
+        assert sum(1 for other in times[i:] if other - time < timedelta(seconds=60)) <= 1
+
+
+def test_jitter_still_varies_times_when_there_is_slack():
+    planner = SendPlanner(START, START + timedelta(hours=1), 10, max_per_minute=60, jitter=0.5, seed=11)
+    assert len({round(gap, 6) for gap in gaps(all_times(planner))}) > 1